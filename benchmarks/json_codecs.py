@@ -0,0 +1,53 @@
+"""Benchmark JSON codecs on embedded-dict-heavy ".qs" rows.
+
+    python benchmarks/json_codecs.py [ROWS]
+
+Times deserializing rows and encoding them as JSON like `qs-parse` does, and
+serializing records back into rows like `qs-format` does, per codec.
+"""
+
+import random
+import sys
+from timeit import timeit
+
+from qsck import codec, deserialize, serialize
+from qsck.util import _encode_json_record
+
+
+def _make_records(num_rows: int) -> list:
+    rng = random.Random(38)
+    records = []
+    for idx in range(num_rows):
+        records.append(('LOG', str(1546902289 + idx), [
+            ('_model', rng.choice(['SM-N960U', 'LG-M327'])),
+            ('event_vars', [('subtype', 'disconnected')]),
+            ('info_runDat4', {'app_install_time': 1545251927594 + idx,
+                              'path': '/data/app/com.example-1/base.apk',
+                              'battery': rng.random() * 100,
+                              'roaming': rng.random() < 0.5,
+                              'app': f'com.example.app{rng.randint(0, 99)}'}),
+            ('info_runDat5', {'free_bytes': rng.randint(0, 2 ** 40),
+                              'ratio': rng.random(), 'label': None}),
+            ('time', str(1546902289176 + idx))]))
+
+    return records
+
+
+def main(num_rows: int = 20000) -> None:
+    records = _make_records(num_rows)
+    qs_rows = [serialize(*record) for record in records]
+
+    print(f'{"codec":8} {"parse rows/s":>14} {"format rows/s":>14}')
+    for codec_name in codec.available_codecs():
+        codec.set_codec(codec_name)
+        parse_seconds = timeit(lambda: [
+            _encode_json_record(deserialize(qs_row)) for qs_row in qs_rows],
+            number=3) / 3
+        format_seconds = timeit(lambda: [
+            serialize(*record) for record in records], number=3) / 3
+        print(f'{codec_name:8} {num_rows / parse_seconds:14,.0f} '
+              f'{num_rows / format_seconds:14,.0f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,150 @@
+"""Seekable block-compressed ".qs.bgz" files, BGZF-style.
+
+A ".qs.bgz" file is a series of independent gzip members, each holding whole
+rows and at most about `block_size` bytes of them uncompressed, so plain
+`gzip -d` reads it like any ".qs.gz" file. A sidecar block table, stored with
+a `.blocks` suffix added, records each member's offset, compressed size, line
+count and timestamp range, for parallel decompression and seeking. It also
+records the file's size and modification time, and is ignored once the file
+no longer matches them.
+"""
+
+import gzip
+import io
+import os
+import sys
+
+from . import codec
+
+BLOCK_TABLE_SUFFIX = '.blocks'
+
+
+class BlockGzipWriter:
+    """Writes rows as bounded-size independent gzip members, plus block table.
+    """
+
+    def __init__(self, fileobj_or_path, block_size: int = 1024 * 1024,
+                 compresslevel: int = 6, block_table_path: str = None):
+        self._path = None
+        if isinstance(fileobj_or_path, str):
+            self._fileobj = open(fileobj_or_path, 'wb')
+            self._owns_fileobj = True
+            self._path = fileobj_or_path
+            if block_table_path is None:
+                block_table_path = fileobj_or_path + BLOCK_TABLE_SUFFIX
+        else:
+            self._fileobj = fileobj_or_path
+            self._owns_fileobj = False
+
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        self.block_table_path = block_table_path
+        self.blocks = []
+
+        self._offset = 0
+        self._rows, self._rows_size = [], 0
+        self._min_timestamp, self._max_timestamp = None, None
+
+    def write_row(self, qs_row: bytes, timestamp: int) -> None:
+        """Add newline-terminated *qs_row*, stamped *timestamp*, to the block.
+        """
+
+        if self._rows and self._rows_size + len(qs_row) > self.block_size:
+            self._write_block()
+
+        self._rows.append(qs_row)
+        self._rows_size += len(qs_row)
+        if self._min_timestamp is None or timestamp < self._min_timestamp:
+            self._min_timestamp = timestamp
+        if self._max_timestamp is None or timestamp > self._max_timestamp:
+            self._max_timestamp = timestamp
+
+    def _write_block(self) -> None:
+        if not self._rows:
+            return
+
+        member = gzip.compress(b''.join(self._rows), self.compresslevel)
+        self._fileobj.write(member)
+        self.blocks.append({'offset': self._offset,
+                            'size': len(member),
+                            'lines': len(self._rows),
+                            'min_timestamp': self._min_timestamp,
+                            'max_timestamp': self._max_timestamp})
+
+        self._offset += len(member)
+        self._rows, self._rows_size = [], 0
+        self._min_timestamp, self._max_timestamp = None, None
+
+    def flush(self) -> None:
+        """Close the current block early and flush the output file."""
+
+        self._write_block()
+        self._fileobj.flush()
+
+    def close(self) -> None:
+        """Write the last block and the block table, close owned files."""
+
+        self._write_block()
+        if self._owns_fileobj:
+            self._fileobj.close()
+        else:
+            self._fileobj.flush()
+
+        if self.block_table_path is not None:
+            block_table = {'blocks': self.blocks}
+            source_stat = self._stat()
+            if source_stat is not None:
+                block_table['source_size'] = source_stat.st_size
+                block_table['source_mtime_ns'] = source_stat.st_mtime_ns
+            with open(self.block_table_path, 'w') as block_table_file:
+                block_table_file.write(codec.dumps(block_table))
+
+    def _stat(self):
+        """Stat the written file, `None` for file objects without a file."""
+
+        if self._path is not None:
+            return os.stat(self._path)
+
+        try:
+            return os.fstat(self._fileobj.fileno())
+        except (AttributeError, OSError, ValueError):
+            return None
+
+
+def read_block_table(input_qs_path: str):
+    """Load the block table of *input_qs_path*, `None` if missing or out of
+    date.
+    """
+
+    try:
+        with open(input_qs_path + BLOCK_TABLE_SUFFIX) as block_table_file:
+            block_table = codec.loads(block_table_file.read())
+    except FileNotFoundError:
+        return None
+
+    source_stat = os.stat(input_qs_path)
+    if block_table.get('source_size') != source_stat.st_size or \
+            block_table.get('source_mtime_ns') != source_stat.st_mtime_ns:
+        print(f'Ignoring out-of-date block table of {input_qs_path}',
+              file=sys.stderr)
+        return None
+
+    blocks = block_table['blocks']
+    first_line = 1
+    for block in blocks:
+        block['first_line'] = first_line
+        first_line += block['lines']
+
+    return blocks
+
+
+def read_block(input_qs_path: str, block: dict) -> [bytes]:
+    """Seek to and decompress a single *block* of *input_qs_path* into rows.
+    """
+
+    with open(input_qs_path, 'rb') as input_qs_file:
+        input_qs_file.seek(block['offset'])
+        member = input_qs_file.read(block['size'])
+
+    # Split on `\n` only, like iterating over a file, not on `\r` in rows.
+    return io.BytesIO(gzip.decompress(member)).readlines()
@@ -0,0 +1,73 @@
+"""Module providing the `SegmentCache` for memoizing nested value parsing."""
+
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def _copy_value(value):
+    """Copy a parsed nested value deep enough that callers can't mutate ours.
+    """
+
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    elif isinstance(value, tuple):
+        return tuple(_copy_value(item) for item in value)
+    elif isinstance(value, dict):
+        return value.__class__(
+            (key, _copy_value(item)) for key, item in value.items())
+    else:
+        return value
+
+
+class SegmentCache:
+    """Size-bounded LRU cache of parsed nested `={...}` segments.
+
+    Keyed on the raw text of a segment, returning a fresh copy of its parsed
+    value on every hit. Pass one to `deserialize(..., cache=...)`.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, segment_key, default=_MISSING):
+        """Get a copy of the value cached under *segment_key*, if any."""
+
+        try:
+            value = self._entries[segment_key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(segment_key)
+        self.hits += 1
+
+        return _copy_value(value)
+
+    def put(self, segment_key, value) -> None:
+        """Cache a copy of *value*, evicting the least recently used entry."""
+
+        self._entries[segment_key] = _copy_value(value)
+        self._entries.move_to_end(segment_key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'size': len(self),
+                'maxsize': self.maxsize}
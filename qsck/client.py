@@ -0,0 +1,69 @@
+"""Module providing the thin `qs-parse-client` command-line tool.
+
+Sends paths to a `qs-parse --serve SOCKET` daemon and relays its output,
+without importing `click`, `ujson` or the parser itself, so it starts fast.
+"""
+
+import os
+import socket
+import struct
+import sys
+
+_FRAME_HEADER = struct.Struct('!cI')
+
+
+def _read_exactly(connection_file, size: int) -> bytes:
+    data = connection_file.read(size)
+    if len(data) != size:
+        raise ConnectionError('Connection to qs-parse daemon lost')
+
+    return data
+
+
+def request(socket_path: str, input_qs_paths: [str], stdout=None,
+            stderr=None) -> int:
+    """Have the daemon at *socket_path* parse *input_qs_paths*.
+
+    Relays parsed output to binary *stdout* and errors to binary *stderr*,
+    returns the daemon's exit status.
+    """
+
+    stdout = stdout or sys.stdout.buffer
+    stderr = stderr or sys.stderr.buffer
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(''.join(
+            os.path.abspath(input_qs_path) + '\n'
+            for input_qs_path in input_qs_paths).encode('utf-8'))
+        connection.shutdown(socket.SHUT_WR)
+
+        with connection.makefile('rb') as connection_file:
+            while True:
+                channel, size = _FRAME_HEADER.unpack(
+                    _read_exactly(connection_file, _FRAME_HEADER.size))
+                payload = _read_exactly(connection_file, size)
+                if channel == b'o':
+                    stdout.write(payload)
+                elif channel == b'e':
+                    stderr.write(payload)
+                elif channel == b'x':
+                    return int(payload)
+
+
+def main() -> None:
+    """Usage: qs-parse-client SOCKET [PATH...], or paths on stdin."""
+
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print(main.__doc__, file=sys.stderr)
+        sys.exit(2)
+
+    input_qs_paths = sys.argv[2:] or [line.rstrip('\n') for line in sys.stdin
+                                      if line.strip()]
+    exit_status = request(sys.argv[1], input_qs_paths)
+    sys.stdout.flush()
+    sys.exit(exit_status)
+
+
+if __name__ == '__main__':
+    main()
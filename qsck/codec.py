@@ -0,0 +1,231 @@
+"""Pluggable JSON codecs, for nested dict values and the command-line tools.
+
+All codecs output the exact same JSON text as `ujson` does, compact, ASCII
+only and with escaped forward slashes, floats in their shortest round-trip
+form (`1e+16`, `1e-5`). Backends that format some things differently check
+their output for them, and encode the few affected values exactly instead.
+Infinite and NaN floats, which JSON has no literals for, raise `OverflowError`
+in every codec.
+
+The fastest installed codec is used, unless another one is named by the
+`QSCK_JSON_CODEC` environment variable, or with `set_codec`. Being the
+reference, `ujson` is fastest too, as checking `orjson` output for exactness
+costs more than `orjson` saves (see `benchmarks/json_codecs.py`).
+"""
+
+import json
+import os
+import re
+import warnings
+from functools import partial
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+CODEC_ENV_VAR = 'QSCK_JSON_CODEC'
+
+_ESCAPED_CHARS = re.compile(r'[\\"/]|[^ -\x7f]')
+_ESCAPES = dict(json.encoder.ESCAPE_DCT, **{'/': '\\/'})
+_FLOAT_EXPONENT_PADDING = re.compile(r'e([+-])0(?=\d)')
+
+
+def _escape_char(char_match) -> str:
+    char = char_match.group(0)
+    try:
+        return _ESCAPES[char]
+    except KeyError:
+        code_point = ord(char)
+        if code_point < 0x10000:
+            return '\\u%04x' % code_point
+
+        code_point -= 0x10000
+        return '\\u%04x\\u%04x' % (0xd800 | code_point >> 10,
+                                   0xdc00 | code_point & 0x3ff)
+
+
+def _encode_exact(obj) -> str:
+    """Encode *obj* just like `ujson.dumps` does, slowly but dependency-free.
+    """
+
+    if isinstance(obj, str):
+        return '"' + _ESCAPED_CHARS.sub(_escape_char, obj) + '"'
+    elif obj is None:
+        return 'null'
+    elif obj is True:
+        return 'true'
+    elif obj is False:
+        return 'false'
+    elif isinstance(obj, int):
+        return int.__repr__(obj)
+    elif isinstance(obj, float):
+        if obj != obj or obj in (float('inf'), float('-inf')):
+            raise OverflowError(f'Invalid {obj!r} value when encoding double')
+        return _FLOAT_EXPONENT_PADDING.sub(r'e\1', float.__repr__(obj))
+    elif isinstance(obj, dict):
+        return '{%s}' % ','.join(
+            _encode_exact(key if isinstance(key, str) else _encode_key(key)) +
+            ':' + _encode_exact(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return '[%s]' % ','.join(_encode_exact(item) for item in obj)
+    else:
+        raise TypeError(f'{obj!r} is not JSON serializable')
+
+
+def _encode_key(key) -> str:
+    if key is None or isinstance(key, (bool, int, float)):
+        return _encode_exact(key)
+    raise TypeError(f'Dict key {key!r} is not JSON serializable')
+
+
+class JSONCodec:
+    """Encodes and decodes JSON text through a backend *name*."""
+
+    name = None
+
+    def dumps(self, obj) -> str:
+        raise NotImplementedError
+
+    def loads(self, json_text):
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f'<JSONCodec {self.name}>'
+
+
+class UjsonCodec(JSONCodec):
+    """The reference codec, as `ujson` formats exactly as it should."""
+
+    name = 'ujson'
+
+    def __init__(self):
+        try:
+            self.dumps = partial(ujson.dumps, allow_nan=False)
+            self.dumps(0.0)
+        except TypeError:  # No `allow_nan` yet, non-finite floats raise.
+            self.dumps = ujson.dumps
+        self.loads = ujson.loads
+
+
+class StdlibCodec(JSONCodec):
+    """Standard library `json`, escaping forward slashes after the fact.
+
+    Its floats pad exponents to two digits and it escapes `\\x7f`, so output
+    with any of those is encoded exactly instead. JSON it's too strict for,
+    like `06` or raw newlines in strings, is left to `ujson` if installed.
+    """
+
+    name = 'json'
+
+    _ENCODER = json.JSONEncoder(separators=(',', ':'), allow_nan=False)
+
+    def loads(self, json_text):
+        try:
+            return json.loads(json_text)
+        except ValueError:
+            if ujson is None:
+                raise
+            return ujson.loads(json_text)  # Decode, or raise, leniently.
+
+    def dumps(self, obj) -> str:
+        try:
+            json_text = self._ENCODER.encode(obj)
+        except ValueError as encode_err:
+            raise OverflowError(str(encode_err)) from None
+        if 'e-0' in json_text or '\\u007f' in json_text:
+            return _encode_exact(obj)
+
+        return json_text.replace('/', '\\/')
+
+
+class OrjsonCodec(JSONCodec):
+    """`orjson`, falling back to the reference codec where it's inexact.
+
+    It outputs UTF-8 rather than escapes, floats like `1e16` and `0.00001`,
+    infinite and NaN floats as `null`, can't encode ints over 64 bits or
+    non-`str` dict keys, and decodes ints outside the 64-bit ranges as floats,
+    so JSON with any of 19+ digits is left to the reference codec.
+    """
+
+    name = 'orjson'
+
+    _POSITIVE_EXPONENT = re.compile(rb'e[0-9]')
+    _LONG_INT = re.compile(r'[0-9]{19}')
+    _LONG_INT_BYTES = re.compile(rb'[0-9]{19}')
+
+    def __init__(self):
+        self._reference_codec = get_codec('ujson' if ujson else 'json')
+
+    def dumps(self, obj) -> str:
+        try:
+            json_bytes = orjson.dumps(obj)
+        except TypeError:
+            return self._reference_codec.dumps(obj)
+
+        if not json_bytes.isascii() or b'0.0000' in json_bytes or \
+                b'null' in json_bytes or \
+                self._POSITIVE_EXPONENT.search(json_bytes):
+            return self._reference_codec.dumps(obj)
+
+        return json_bytes.replace(b'/', b'\\/').decode('ascii')
+
+    def loads(self, json_text):
+        long_int = self._LONG_INT_BYTES if isinstance(json_text, bytes) \
+            else self._LONG_INT
+        if not long_int.search(json_text):
+            try:
+                return orjson.loads(json_text)
+            except ValueError:
+                pass  # Have the reference codec decode, or raise, as usual.
+
+        return self._reference_codec.loads(json_text)
+
+
+# Codecs by name, fastest first.
+CODECS = {'ujson': UjsonCodec, 'orjson': OrjsonCodec, 'json': StdlibCodec}
+
+
+def available_codecs() -> [str]:
+    """Names of the installed codecs, fastest first."""
+
+    return [name for name, backend in (('ujson', ujson), ('orjson', orjson),
+                                       ('json', json)) if backend is not None]
+
+
+def get_codec(name: str = 'auto') -> JSONCodec:
+    """Get a codec by *name*, or the fastest installed one for `'auto'`."""
+
+    if name == 'auto':
+        name = available_codecs()[0]
+    elif name not in CODECS:
+        raise ValueError(f'Unknown JSON codec {name!r}, must be `auto` or one '
+                         f'of {", ".join(CODECS)}')
+    elif name not in available_codecs():
+        raise ValueError(f'JSON codec {name!r} is not installed')
+
+    return CODECS[name]()
+
+
+def set_codec(name: str = 'auto') -> JSONCodec:
+    """Switch `dumps` and `loads`, as used by `qsck`, to codec *name*."""
+
+    global active_codec, dumps, loads
+
+    active_codec = get_codec(name)
+    dumps, loads = active_codec.dumps, active_codec.loads
+
+    return active_codec
+
+
+active_codec = dumps = loads = None
+try:
+    set_codec(os.environ.get(CODEC_ENV_VAR, 'auto'))
+except ValueError as codec_err:
+    warnings.warn(f'{codec_err}, set by {CODEC_ENV_VAR}, using `auto`')
+    set_codec('auto')
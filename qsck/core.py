@@ -0,0 +1,75 @@
+"""The core .qs row serialize/deserialize functions."""
+
+from datetime import datetime
+from itertools import islice
+
+from .util import (_validate_and_cast_timestamp_to_epoch_str,
+                   _format_key_value_pairs, _reconstruct_comma_values,
+                   _reconstruct_key_value_pairs)
+from .cache import SegmentCache
+
+
+def serialize(identifier: str, timestamp, key_value_pairs: []) -> str:
+    """Format input parameters as a .qs-style row -- the simple part! :)"""
+
+    components = [identifier,
+                  _validate_and_cast_timestamp_to_epoch_str(timestamp)]
+    components.extend(_format_key_value_pairs(key_value_pairs))
+
+    return ','.join(components) + '\n'
+
+
+def deserialize(qs_row: str, raw_json: bool = False,
+                cache: SegmentCache = None) -> (str, datetime, []):
+    """Parse `qs_row`, return as a identifier-timestamp-key_value_pairs 3-tuple.
+
+    With `raw_json`, nested dict values are returned as `RawJSON` strings
+    holding their verbatim JSON text instead of being decoded. With a
+    `cache`, parsed nested `={...}` values are memoized by their raw text.
+    """
+
+    input_components = qs_row.rstrip().split(',')
+    if len(input_components) < 3:
+        raise AssertionError(f'Malformatted input row {qs_row!r}')
+
+    identifier, timestamp = input_components[:2]
+
+    components = _reconstruct_comma_values(input_components[2:])
+
+    key_value_thingies = _reconstruct_key_value_pairs(components, raw_json,
+                                                      cache)
+
+    return identifier, timestamp, key_value_thingies
+
+
+def iter_deserialize(qs_rows, raw_json: bool = False,
+                     cache: SegmentCache = None, on_error=None,
+                     schema=None, batch_size: int = 10000):
+    """Lazily deserialize an iterable of `qs_rows`, e.g. an open ".qs" file.
+
+    Rows may be `str` or UTF-8 `bytes`, blank ones are skipped. Errors are
+    raised, unless an `on_error(row_number, qs_row, exception)` callback is
+    given to handle them, in which case the row is skipped. With a `schema`,
+    values are coerced to their types in batches of `batch_size` records.
+    """
+
+    if schema is not None:
+        records = iter_deserialize(qs_rows, raw_json, cache, on_error)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            yield from schema.coerce(batch)[0]
+
+    for idx, qs_row in enumerate(qs_rows, 1):
+        if isinstance(qs_row, bytes):
+            qs_row = qs_row.decode('utf-8')
+        if not qs_row.strip():
+            continue
+
+        try:
+            yield deserialize(qs_row, raw_json, cache)
+        except Exception as parse_err:
+            if on_error is None:
+                raise
+            on_error(idx, qs_row, parse_err)
@@ -4,17 +4,34 @@ import bz2
 import gzip
 
 import click
-import ujson
 
-from . import serialize
+from . import codec, serialize, QsWriter
 
 
 @click.command()
 @click.argument('input_json_path', type=click.Path(exists=True, dir_okay=False))
-def qs_format(input_json_path) -> None:
+@click.option('--output', 'output_qs_path', type=click.Path(dir_okay=False),
+              default=None,
+              help='Write to `.qs`, `.qs.gz`, `.qs.bz2` or seekable '
+                   '`.qs.bgz` file instead of stdout.')
+@click.option('--block-size', type=click.IntRange(min=1), default=1024,
+              show_default=True,
+              help='Max uncompressed KiB per `.qs.bgz` block.')
+@click.option('--json-codec', type=click.Choice(['auto'] + list(codec.CODECS)),
+              default=None,
+              help='JSON codec to use, by default the fastest installed one, '
+                   f'or `${codec.CODEC_ENV_VAR}`.')
+def qs_format(input_json_path, output_qs_path, block_size,
+              json_codec) -> None:
     """Reads JSON file with one record per line, outputs .qs records to stdout.
     """
 
+    if json_codec is not None:
+        try:
+            codec.set_codec(json_codec)
+        except ValueError as codec_err:
+            raise click.BadParameter(str(codec_err), param_hint='--json-codec')
+
     if input_json_path.endswith('.json.bz2'):
         input_json_file = bz2.open(input_json_path, 'rb')
     elif input_json_path.endswith('.json.gz'):
@@ -25,8 +42,15 @@ def qs_format(input_json_path) -> None:
         raise TypeError(f'Unsupported file suffix for {input_json_path}, '
                         f'must be `.json`, `.json.bz2` or `.json.gz`.')
 
+    if output_qs_path is not None:
+        with QsWriter(output_qs_path, block_size=block_size * 1024) as writer:
+            for qs_row in input_json_file:
+                input_record = codec.loads(qs_row)
+                writer.write(input_record[0], input_record[1], input_record[2])
+        return
+
     for qs_row in input_json_file.readlines():
-        input_record = ujson.loads(qs_row)
+        input_record = codec.loads(qs_row)
         print(serialize(input_record[0], input_record[1], input_record[2]),
               end='')
 
@@ -0,0 +1,291 @@
+"""Differential fuzzing of the deserialize engines against the reference.
+
+Rows come from serializing randomly generated records, and from randomly
+mutating rows of real ".qs" files. Each row is deserialized by every engine,
+i.e. every mode and option that's meant to give the same result, like
+`raw_json`, a fresh or run-long `SegmentCache` or another JSON codec, and
+compared with plain `deserialize` with the reference `ujson` codec. Rows any
+engine disagrees on, by returning something else or by raising where the
+reference doesn't (or vice versa), are reduced to a minimal row the
+disagreement still shows on.
+"""
+
+import random
+from collections import namedtuple
+from datetime import datetime
+
+from . import codec
+from .cache import SegmentCache
+from .core import deserialize, iter_deserialize, serialize
+from .util import RawJSON, _encode_json_record
+
+# Pieces of generated text values, heavy on the format's special characters.
+_TEXT_PIECES = ('a', 'foo', 'x y', 'MOBILE[LTE]', '-3', '1.5', '(null)', ',',
+                ', ', ':', ': ', '=', '[', ']', '{', '}', ']}', ' ', '"', '/',
+                '\\', 'é', '')
+_KEYS = ('k', '_model', 'event_vars', 'subtype', 'networkInfo', 'type',
+         'info_runDat4', 'x1', '2nd_key')
+
+# Characters inserted by mutations.
+_MUTATION_CHARS = ',={}[]:" \\/\nx1'
+
+_Y2K = 946684800
+
+# Small enough for long fuzz runs to keep evicting values.
+_SHARED_CACHE_SIZE = 1024
+
+Mismatch = namedtuple('Mismatch', 'qs_row minimal_qs_row outcomes')
+Mismatch.__doc__ = """A row engines disagree on, reduced to a minimal one.
+
+*outcomes* maps the names of the reference and disagreeing engines to their
+outcomes on the minimal row.
+"""
+
+
+def _random_text(rng: random.Random) -> str:
+    return ''.join(rng.choice(_TEXT_PIECES)
+                   for _ in range(rng.randint(0, 4)))
+
+
+def _random_key(rng: random.Random) -> str:
+    return rng.choice(_KEYS) + rng.choice(('', '', str(rng.randint(0, 9))))
+
+
+def _random_json_value(rng: random.Random):
+    return rng.choice((
+        None, True, False, rng.randint(-10 ** 15, 10 ** 15),
+        # Around the 64-bit bounds, where JSON backends differ.
+        rng.choice((-1, 1)) * rng.choice((2 ** 63, 2 ** 64)) +
+        rng.randint(-2, 1),
+        rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-12, 12),
+        _random_text(rng)))
+
+
+def _random_value(rng: random.Random):
+    value_kind = rng.randrange(6)
+    if value_kind == 0:
+        return None
+    elif value_kind == 1:
+        return [(_random_key(rng),
+                 _random_text(rng) if rng.random() < 0.7 else
+                 [(_random_key(rng), _random_text(rng))
+                  for _ in range(rng.randint(0, 3))])
+                for _ in range(rng.randint(0, 4))]
+    elif value_kind == 2:
+        return {_random_key(rng): _random_json_value(rng)
+                for _ in range(rng.randint(0, 4))}
+    else:
+        return _random_text(rng)
+
+
+def _random_level2_nested_list(rng: random.Random) -> list:
+    # Plain values, so they make a valid, cacheable segment.
+    return [(_random_key(rng), [(_random_key(rng), _random_key(rng))
+                                for _ in range(rng.randint(1, 3))])]
+
+
+def _unclosed_level2_text(rng: random.Random) -> str:
+    """Nested list text with its level 2 list closed by a `key=value}` pair,
+    leaving the parser's level 2 state behind for what follows it.
+    """
+
+    return (f'{_random_key(rng)}={{k=v, {_random_key(rng)}=[p: '
+            f'{rng.randint(0, 9)}, {_random_key(rng)}={rng.randint(0, 9)}}}')
+
+
+def generate_qs_rows(num_rows: int, seed: int = 0):
+    """Yield *num_rows* rows serialized from random records.
+
+    Some come in pairs of a row with an unclosed level 2 list followed by a
+    nested list, and a row with just that nested list, which must parse the
+    same in both whether or not it's cached.
+    """
+
+    rng = random.Random(seed)
+    now = int(datetime.utcnow().timestamp())
+    num_generated = 0
+    while num_generated < num_rows:
+        identifier = rng.choice(('LOG', 'EVT', 'ERR'))
+        timestamp = rng.randint(_Y2K + 1, now)
+        if rng.random() < 0.05:
+            qs_row = serialize(identifier, timestamp, [
+                (_random_key(rng), _random_level2_nested_list(rng))])
+            prefix_end = qs_row.find(',', len(identifier) + 1) + 1
+            qs_rows = [qs_row[:prefix_end] + _unclosed_level2_text(rng) +
+                       ',' + qs_row[prefix_end:], qs_row]
+        else:
+            qs_rows = [serialize(identifier, timestamp, [
+                (_random_key(rng), _random_value(rng))
+                for _ in range(rng.randint(1, 6))])]
+
+        for qs_row in qs_rows[:num_rows - num_generated]:
+            yield qs_row.rstrip('\n')
+        num_generated += len(qs_rows)
+
+
+def mutate_qs_row(qs_row: str, rng: random.Random) -> str:
+    """Apply one to three random edits to *qs_row*, keeping its prefix."""
+
+    prefix_end = qs_row.find(',', qs_row.find(',') + 1) + 1
+    prefix, body = qs_row[:prefix_end], qs_row[prefix_end:]
+    for _ in range(rng.randint(1, 3)):
+        idx = rng.randint(0, len(body))
+        mutation = rng.randrange(4)
+        if mutation == 0:
+            body = body[:idx] + rng.choice(_MUTATION_CHARS) + body[idx:]
+        elif mutation == 1:
+            body = body[:idx] + body[idx + 1:]
+        elif mutation == 2:
+            end = rng.randint(idx, min(len(body), idx + 20))
+            body = body[:end] + body[idx:end] + body[end:]
+        else:
+            body = body[:idx]
+
+    return prefix + body
+
+
+def mutate_qs_rows(qs_rows: [str], num_rows: int, seed: int = 0):
+    """Yield *num_rows* random mutations of rows picked from *qs_rows*."""
+
+    rng = random.Random(seed)
+    for _ in range(num_rows):
+        yield mutate_qs_row(rng.choice(qs_rows), rng)
+
+
+def _decode_raw_json(record: tuple) -> tuple:
+    identifier, timestamp, key_value_pairs = record
+    return identifier, timestamp, [
+        (key, codec.loads(value) if isinstance(value, RawJSON) else value)
+        for key, value in key_value_pairs]
+
+
+def _deserialize_with_codec(codec_name: str):
+    def deserialize_with_codec(qs_row: str):
+        previous_codec_name = codec.active_codec.name
+        codec.set_codec(codec_name)
+        try:
+            return deserialize(qs_row)
+        finally:
+            codec.set_codec(previous_codec_name)
+
+    return deserialize_with_codec
+
+
+def _deserialize_with_cache(qs_row: str, raw_json: bool = False):
+    """Deserialize *qs_row* into an empty cache, then again from cache."""
+
+    cache = SegmentCache()
+    cache_miss_record = deserialize(qs_row, raw_json, cache)
+    cache_hit_record = deserialize(qs_row, raw_json, cache)
+    if cache_hit_record != cache_miss_record:
+        raise AssertionError(f'Cache hit {cache_hit_record!r} differs from '
+                             f'cache miss {cache_miss_record!r}')
+
+    return cache_hit_record
+
+
+def _deserialize_with_shared_cache(cache: SegmentCache):
+    """Deserialize rows with one *cache*, kept across rows and its evictions.
+    """
+
+    def deserialize_with_shared_cache(qs_row: str):
+        return deserialize(qs_row, cache=cache)
+
+    deserialize_with_shared_cache.cache = cache
+    return deserialize_with_shared_cache
+
+
+def reference_engine(qs_row: str):
+    reference_codec_name = 'ujson' if 'ujson' in codec.available_codecs() \
+        else 'json'
+    return _deserialize_with_codec(reference_codec_name)(qs_row)
+
+
+def available_engines() -> dict:
+    """Engines to compare with `reference_engine`, by name.
+
+    The `shared_cache` engine's cache lives as long as the engines, so it sees
+    values cached from all rows checked before.
+    """
+
+    engines = {
+        'cache': _deserialize_with_cache,
+        'shared_cache': _deserialize_with_shared_cache(
+            SegmentCache(_SHARED_CACHE_SIZE)),
+        'raw_json': lambda qs_row: _decode_raw_json(deserialize(qs_row, True)),
+        'raw_json+cache': lambda qs_row: _decode_raw_json(
+            _deserialize_with_cache(qs_row, True)),
+        'iter_deserialize': lambda qs_row: next(iter_deserialize([qs_row])),
+        'json_output': lambda qs_row: codec.loads(_encode_json_record(
+            deserialize(qs_row, True)))}
+    for codec_name in codec.available_codecs():
+        engines[f'codec={codec_name}'] = _deserialize_with_codec(codec_name)
+
+    return engines
+
+
+def _run_engine(engine, qs_row: str) -> str:
+    """Run *engine* on *qs_row*, return its outcome, comparable as JSON."""
+
+    # noinspection PyBroadException
+    try:
+        return _encode_json_record(engine(qs_row))
+    except Exception as parse_err:
+        return f'{parse_err.__class__.__name__}'
+
+
+def check_qs_row(qs_row: str, engines: dict) -> dict:
+    """Get the outcomes of *engines* disagreeing with the reference on
+    *qs_row*, along with the reference one, or `{}` if all agree.
+    """
+
+    reference_outcome = _run_engine(reference_engine, qs_row)
+    reference_failed = not reference_outcome.startswith('[')
+    outcomes = {}
+    for engine_name, engine in engines.items():
+        outcome = _run_engine(engine, qs_row)
+        failed = not outcome.startswith('[')
+        if failed != reference_failed or \
+                (not failed and outcome != reference_outcome):
+            outcomes[engine_name] = outcome
+
+    if outcomes:
+        outcomes['reference'] = reference_outcome
+    return outcomes
+
+
+def reduce_qs_row(qs_row: str, engines: dict) -> str:
+    """Shrink *qs_row* while *engines* still disagree with the reference.
+
+    Greedily drops ever smaller chunks of the row, ddmin-style.
+    """
+
+    chunk_size = len(qs_row) // 2
+    while chunk_size >= 1:
+        start = 0
+        while start < len(qs_row):
+            candidate_row = qs_row[:start] + qs_row[start + chunk_size:]
+            if candidate_row and check_qs_row(candidate_row, engines):
+                qs_row = candidate_row
+            else:
+                start += chunk_size
+        chunk_size //= 2
+
+    return qs_row
+
+
+def fuzz(qs_rows, engines: dict = None):
+    """Check every row of *qs_rows*, yield a `Mismatch` for each one engines
+    disagree on.
+    """
+
+    engines = engines if engines is not None else available_engines()
+    for qs_row in qs_rows:
+        outcomes = check_qs_row(qs_row, engines)
+        if outcomes:
+            disagreeing_engines = {engine_name: engines[engine_name]
+                                   for engine_name in outcomes
+                                   if engine_name != 'reference'}
+            minimal_qs_row = reduce_qs_row(qs_row, disagreeing_engines)
+            yield Mismatch(qs_row, minimal_qs_row,
+                           check_qs_row(minimal_qs_row, disagreeing_engines))
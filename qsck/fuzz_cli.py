@@ -0,0 +1,67 @@
+"""Module providing the `qs-fuzz` command-line tool."""
+
+import sys
+from itertools import chain, islice
+
+import click
+
+from .fuzz import available_engines, fuzz, generate_qs_rows, mutate_qs_rows
+from .util import _open_qs_file
+
+
+def _read_corpus(corpus_qs_paths: tuple) -> [str]:
+    corpus_qs_rows = []
+    for corpus_qs_path in corpus_qs_paths:
+        with _open_qs_file(corpus_qs_path) as corpus_qs_file:
+            corpus_qs_rows.extend(
+                qs_row.decode('utf-8', 'replace').rstrip('\r\n')
+                for qs_row in corpus_qs_file if qs_row.strip())
+
+    return corpus_qs_rows
+
+
+@click.command()
+@click.argument('corpus_qs_paths', nargs=-1,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--rows', 'num_rows', type=click.IntRange(min=0),
+              default=10000, show_default=True,
+              help='Rows to generate from random records.')
+@click.option('--mutations', 'num_mutations', type=click.IntRange(min=0),
+              default=10000, show_default=True,
+              help='Random mutations of corpus rows to check.')
+@click.option('--seed', type=int, default=0, show_default=True,
+              help='Seed for generating and mutating rows.')
+@click.option('--max-reports', type=click.IntRange(min=1), default=20,
+              show_default=True, help='Stop after this many mismatches.')
+def qs_fuzz(corpus_qs_paths, num_rows, num_mutations, seed, max_reports):
+    """Checks deserialize engines and modes against the reference parser.
+
+    Generated rows, corpus rows and mutations of them are deserialized by
+    each engine, exits non-zero if any disagrees with plain `deserialize`,
+    printing the smallest row it still disagrees on.
+    """
+
+    engines = available_engines()
+    print(f'Checking engines {", ".join(engines)}', file=sys.stderr)
+
+    corpus_qs_rows = _read_corpus(corpus_qs_paths)
+    qs_rows = chain(generate_qs_rows(num_rows, seed), corpus_qs_rows)
+    if corpus_qs_rows:
+        qs_rows = chain(qs_rows, mutate_qs_rows(corpus_qs_rows,
+                                                num_mutations, seed))
+
+    mismatches = 0
+    for mismatch in islice(fuzz(qs_rows, engines), max_reports):
+        mismatches += 1
+        print(f'Mismatch on {mismatch.minimal_qs_row!r}, reduced from '
+              f'{mismatch.qs_row!r}')
+        for engine_name, outcome in mismatch.outcomes.items():
+            print(f'  {engine_name}: {outcome}')
+
+    if mismatches:
+        sys.exit(1)
+    print('No mismatches', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    qs_fuzz()
@@ -0,0 +1,159 @@
+"""Module providing the `qs-index` and `qs-grep` command-line tools."""
+
+import sys
+from bisect import bisect_right
+from itertools import islice
+
+import click
+
+from . import deserialize
+from .bgzf import read_block, read_block_table
+from .index import build_index, load_index, block_may_match
+from .util import _open_qs_file
+
+
+def _parse_condition(condition: str) -> (str, str):
+    if '=' in condition:
+        key, value = condition.split('=', 1)
+        return key, value
+
+    return condition, None
+
+
+def _row_matches(qs_row: bytes, conditions: list) -> bool:
+    """Verify *qs_row* has all top-level `(key, value)` *conditions*."""
+
+    for key, value in conditions:
+        needle = key if value is None else f'{key}={value}'
+        if needle.encode('utf-8') not in qs_row:
+            return False
+
+    try:
+        _, __, key_value_pairs = deserialize(qs_row.decode('utf-8'))
+    except Exception:
+        return False
+
+    row_values = {}
+    for key, value in key_value_pairs:
+        row_values.setdefault(key, []).append(
+            '(null)' if value is None else value)
+
+    return all(key in row_values and
+               (value is None or value in row_values[key])
+               for key, value in conditions)
+
+
+def _iter_member_rows(input_qs_path: str, index: dict, conditions: list,
+                      members: list):
+    """Yield rows of index blocks that may match *conditions*, decompressing
+    only the ".qs.bgz" *members* holding them.
+    """
+
+    member_first_lines = [member['first_line'] for member in members]
+    member_idx, member_rows = None, None
+    first_line = 1
+    for block in index['blocks']:
+        last_line = first_line + block['lines']
+        if block_may_match(index, block, conditions):
+            line = first_line
+            while line < last_line:
+                idx = bisect_right(member_first_lines, line) - 1
+                if idx != member_idx:
+                    member_idx = idx
+                    member_rows = read_block(input_qs_path, members[idx])
+                member_first_line = members[idx]['first_line']
+                rows = member_rows[line - member_first_line:
+                                   last_line - member_first_line]
+                if not rows:
+                    break  # Past the last member.
+                yield from rows
+                line += len(rows)
+        first_line = last_line
+
+
+def _iter_candidate_rows(input_qs_path: str, conditions: list,
+                         use_index: bool):
+    """Yield rows of *input_qs_path* in blocks that may match *conditions*.
+
+    Block offsets are into the uncompressed rows, so in ".qs.gz" and
+    ".qs.bz2" files seeking to one still decompresses everything before it,
+    only parsing is skipped. ".qs.bgz" files with a block table only have the
+    gzip members holding candidate blocks decompressed.
+    """
+
+    index = load_index(input_qs_path) if use_index else None
+
+    if index is not None and input_qs_path.endswith('.qs.bgz'):
+        members = read_block_table(input_qs_path)
+        if members:
+            yield from _iter_member_rows(input_qs_path, index, conditions,
+                                         members)
+            return
+
+    with _open_qs_file(input_qs_path) as input_qs_file:
+        if index is None:
+            yield from input_qs_file
+            return
+
+        for block in index['blocks']:
+            if block_may_match(index, block, conditions):
+                input_qs_file.seek(block['offset'])
+                yield from islice(input_qs_file, block['lines'])
+
+
+@click.command()
+@click.argument('input_qs_paths', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--block-lines', type=click.IntRange(min=1), default=10000,
+              show_default=True, help='Rows per indexed block.')
+@click.option('--max-cardinality', type=click.IntRange(min=1), default=256,
+              show_default=True,
+              help='Max distinct values for a key to get `key=value` entries.')
+@click.option('--sample-lines', type=click.IntRange(min=1), default=100000,
+              show_default=True,
+              help='Rows sampled to pick low-cardinality keys.')
+def qs_index(input_qs_paths, block_lines, max_cardinality,
+             sample_lines) -> None:
+    """Builds block-level Bloom filter indexes of ".qs" files for `qs-grep`.
+
+    Indexes are stored next to each file, with a `.qsidx` suffix added.
+    """
+
+    for input_qs_path in input_qs_paths:
+        index = build_index(input_qs_path, block_lines, max_cardinality,
+                            sample_lines)
+        print(f'Indexed {len(index["blocks"])} blocks of {input_qs_path}, '
+              f'with values of {len(index["value_keys"])} keys',
+              file=sys.stderr)
+
+
+@click.command()
+@click.argument('query')
+@click.argument('input_qs_paths', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--and', 'extra_queries', multiple=True,
+              help='Additional `key=value` or `key` condition. Repeatable.')
+@click.option('--no-index', is_flag=True, help='Ignore `qs-index` indexes.')
+def qs_grep(query, input_qs_paths, extra_queries, no_index) -> None:
+    """Outputs ".qs" rows with a top-level `key=value` pair, or just `key`.
+
+    Blocks ruled out by a `qs-index` index are skipped without parsing, and
+    candidate rows are verified by deserializing them. Only ".qs.bgz" files
+    skip decompressing them too, other compressed files are decompressed up
+    to the last candidate block.
+    """
+
+    conditions = [_parse_condition(condition)
+                  for condition in (query,) + extra_queries]
+
+    output = sys.stdout.buffer
+    for input_qs_path in input_qs_paths:
+        for qs_row in _iter_candidate_rows(input_qs_path, conditions,
+                                           not no_index):
+            if _row_matches(qs_row, conditions):
+                output.write(qs_row)
+    output.flush()
+
+
+if __name__ == '__main__':
+    qs_grep()
@@ -0,0 +1,201 @@
+"""Block-level Bloom filter indexes of ".qs" files, stored next to them.
+
+Each block of `block_lines` rows gets one Bloom filter of the top-level keys
+present in it, and one of the `key=value` pairs of low-cardinality keys. The
+low-cardinality keys are picked from a sample of rows at the head of the file.
+"""
+
+import base64
+import hashlib
+import math
+import os
+import sys
+from itertools import chain, islice
+
+from . import codec, deserialize
+from .util import _open_qs_file
+
+INDEX_SUFFIX = '.qsidx'
+INDEX_VERSION = 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, with blake2b double hashing."""
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits or (num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float = 0.01):
+        """Size a filter for *capacity* items at a false positive *fp_rate*."""
+
+        capacity = max(capacity, 1)
+        num_bits = max(
+            int(-capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        num_hashes = max(int(round(num_bits / capacity * math.log(2))), 1)
+
+        return cls(num_bits, num_hashes)
+
+    def _bit_positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'),
+                                 digest_size=16).digest()
+        hash1 = int.from_bytes(digest[:8], 'little')
+        hash2 = int.from_bytes(digest[8:], 'little') | 1
+
+        return ((hash1 + i * hash2) % self.num_bits
+                for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._bit_positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._bit_positions(item))
+
+    def to_dict(self) -> dict:
+        return {'num_bits': self.num_bits, 'num_hashes': self.num_hashes,
+                'bits': base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, bloom_dict: dict):
+        return cls(bloom_dict['num_bits'], bloom_dict['num_hashes'],
+                   base64.b64decode(bloom_dict['bits']))
+
+
+def _pair_token(key: str, value) -> str:
+    return f'{key}={"(null)" if value is None else value}'
+
+
+def _sample_value_keys(records: list, max_cardinality: int) -> [str]:
+    """Pick keys with at most *max_cardinality* distinct scalar values."""
+
+    distinct_values, nested_keys = {}, set()
+    for _, __, key_value_pairs in records:
+        for key, value in key_value_pairs:
+            if value is not None and not isinstance(value, str):
+                nested_keys.add(key)
+            else:
+                distinct_values.setdefault(key, set()).add(value)
+
+    return sorted(key for key, values in distinct_values.items()
+                  if len(values) <= max_cardinality and key not in nested_keys)
+
+
+def _iter_offset_rows(input_qs_file):
+    """Yield `(offset, qs_row)` pairs from the binary *input_qs_file*."""
+
+    offset = 0
+    for qs_row in input_qs_file:
+        yield offset, qs_row
+        offset += len(qs_row)
+
+
+def build_index(input_qs_path: str, block_lines: int = 10000,
+                max_cardinality: int = 256, sample_lines: int = 100000,
+                fp_rate: float = 0.01) -> dict:
+    """Build the block index of *input_qs_path* and save it next to the file.
+    """
+
+    source_stat = os.stat(input_qs_path)
+
+    with _open_qs_file(input_qs_path) as input_qs_file:
+        offset_rows = _iter_offset_rows(input_qs_file)
+        sampled_rows = list(islice(offset_rows, sample_lines))
+        sampled_records = []
+        for _, qs_row in sampled_rows:
+            try:
+                sampled_records.append(deserialize(qs_row.decode('utf-8')))
+            except Exception:
+                pass
+        value_keys = _sample_value_keys(sampled_records, max_cardinality)
+        indexed_value_keys = set(value_keys)
+        del sampled_records
+
+        blocks = []
+        all_rows = chain(sampled_rows, offset_rows)
+        while True:
+            block_rows = list(islice(all_rows, block_lines))
+            if not block_rows:
+                break
+
+            keys, pairs = set(), set()
+            for _, qs_row in block_rows:
+                try:
+                    _, __, key_value_pairs = deserialize(
+                        qs_row.decode('utf-8'))
+                except Exception:
+                    continue
+                for key, value in key_value_pairs:
+                    keys.add(key)
+                    if key in indexed_value_keys:
+                        pairs.add(_pair_token(key, value))
+
+            keys_bloom = BloomFilter.for_capacity(len(keys), fp_rate)
+            pairs_bloom = BloomFilter.for_capacity(len(pairs), fp_rate)
+            for key in keys:
+                keys_bloom.add(key)
+            for pair in pairs:
+                pairs_bloom.add(pair)
+
+            blocks.append({'offset': block_rows[0][0],
+                           'lines': len(block_rows),
+                           'keys': keys_bloom.to_dict(),
+                           'pairs': pairs_bloom.to_dict()})
+
+    index = {'version': INDEX_VERSION,
+             'source_size': source_stat.st_size,
+             'source_mtime_ns': source_stat.st_mtime_ns,
+             'block_lines': block_lines,
+             'value_keys': value_keys,
+             'blocks': blocks}
+
+    with open(input_qs_path + INDEX_SUFFIX, 'w') as index_file:
+        index_file.write(codec.dumps(index))
+
+    return index
+
+
+def load_index(input_qs_path: str):
+    """Load the index of *input_qs_path*, `None` if missing or out of date."""
+
+    try:
+        with open(input_qs_path + INDEX_SUFFIX) as index_file:
+            index = codec.loads(index_file.read())
+    except FileNotFoundError:
+        return None
+
+    source_stat = os.stat(input_qs_path)
+    if index.get('version') != INDEX_VERSION or \
+            index['source_size'] != source_stat.st_size or \
+            index['source_mtime_ns'] != source_stat.st_mtime_ns:
+        print(f'Ignoring out-of-date index of {input_qs_path}',
+              file=sys.stderr)
+        return None
+
+    index['value_keys'] = frozenset(index['value_keys'])
+    for block in index['blocks']:
+        block['keys'] = BloomFilter.from_dict(block['keys'])
+        block['pairs'] = BloomFilter.from_dict(block['pairs'])
+
+    return index
+
+
+def block_may_match(index: dict, block: dict, conditions: list) -> bool:
+    """Check whether *block* can hold rows matching all *conditions*.
+
+    Conditions are `(key, value)` pairs, where a `None` value matches any row
+    having the key and `'(null)'` matches null values.
+    """
+
+    value_keys = index['value_keys']
+    for key, value in conditions:
+        if key not in block['keys']:
+            return False
+        if value is not None and key in value_keys and \
+                _pair_token(key, value) not in block['pairs']:
+            return False
+
+    return True
@@ -0,0 +1,302 @@
+"""Module providing the `qs-load` command-line tool."""
+
+import sqlite3
+import sys
+import time
+from functools import partial
+from itertools import chain, islice
+from multiprocessing import Pool
+from re import compile as re_compile
+
+import click
+
+from . import codec, iter_deserialize
+from .util import RawJSON, _open_qs_file, _print_parse_error
+
+_INT_PATTERN = re_compile(r'-?\d+$')
+_REAL_PATTERN = re_compile(r'-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+_SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-262144'
+)
+
+
+# Columns of every table, before those of keys.
+_FIXED_COLUMNS = ('identifier', 'timestamp')
+
+
+def _quote(sql_identifier: str) -> str:
+    return '"%s"' % sql_identifier.replace('"', '""')
+
+
+def _deserialize_chunk(chunk_args: tuple) -> (list, list):
+    """Deserialize a chunk of rows, starting at row *first_line* of its file,
+    in a worker process. Parse errors are returned, for the main process to
+    print.
+    """
+
+    input_qs_path, first_line, qs_rows = chunk_args
+    errors = []
+
+    def _on_error(row_number, qs_row, parse_err):
+        errors.append((input_qs_path, first_line + row_number - 1, qs_row,
+                       str(parse_err)))
+
+    records = list(iter_deserialize(qs_rows, raw_json=True,
+                                    on_error=_on_error))
+
+    return records, errors
+
+
+def _iter_chunks(iterable, chunk_size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_records(input_qs_paths, jobs: int, chunk_size: int):
+    """Deserialize rows from *input_qs_paths*, in *jobs* parallel processes.
+    """
+
+    if jobs == 1:
+        for input_qs_path in input_qs_paths:
+            with _open_qs_file(input_qs_path) as input_qs_file:
+                yield from iter_deserialize(
+                    input_qs_file, raw_json=True,
+                    on_error=partial(_print_parse_error, input_qs_path))
+        return
+
+    def _iter_chunk_args():
+        for input_qs_path in input_qs_paths:
+            with _open_qs_file(input_qs_path) as input_qs_file:
+                for chunk_idx, qs_rows in enumerate(
+                        _iter_chunks(input_qs_file, chunk_size)):
+                    yield input_qs_path, chunk_idx * chunk_size + 1, qs_rows
+
+    with Pool(jobs) as pool:
+        for records, errors in pool.imap(_deserialize_chunk,
+                                         _iter_chunk_args()):
+            for error in errors:
+                _print_parse_error(*error)
+            yield from records
+
+
+def _infer_column_type(values: list) -> str:
+    """Infer the SQLite column type for sampled *values* of one key."""
+
+    values = [value for value in values if value is not None]
+    if not values or not all(isinstance(value, str) for value in values) or \
+            any(isinstance(value, RawJSON) for value in values):
+        return 'TEXT'
+    elif all(_INT_PATTERN.match(value) for value in values):
+        return 'INTEGER'
+    elif all(_REAL_PATTERN.match(value) for value in values):
+        return 'REAL'
+    else:
+        return 'TEXT'
+
+
+def _column_name(key: str) -> str:
+    """Get the column for *key*, prefixed if it clashes with a fixed one.
+
+    Like SQLite, compare column names case-insensitively, keys differing only
+    in case share the column named after the first of them.
+    """
+
+    if key.lower() in _FIXED_COLUMNS:
+        return 'key_' + key
+
+    return key
+
+
+def _infer_columns(records: list) -> dict:
+    """Map columns of top-level keys in *records* to column types, by first
+    appearance.
+    """
+
+    columns, sampled_values = {}, {}
+    for _, __, key_value_pairs in records:
+        for key, value in key_value_pairs:
+            column = _column_name(key)
+            columns.setdefault(column.lower(), column)
+            sampled_values.setdefault(column.lower(), []).append(value)
+
+    return {columns[folded_column]: _infer_column_type(values)
+            for folded_column, values in sampled_values.items()}
+
+
+def _to_sql_value(value):
+    if isinstance(value, list):
+        return codec.dumps(value)
+
+    return value
+
+
+class _SQLiteTableLoader:
+    """Batched `executemany` inserts into a table that grows new columns."""
+
+    def __init__(self, connection, table: str, columns: dict,
+                 batch_size: int, commit_every: int):
+        self.connection = connection
+        self.table = table
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.rows_loaded = 0
+
+        self._batch = []
+        self._uncommitted_rows = 0
+        self._columns = list(_FIXED_COLUMNS)
+        self._column_positions = {}
+        self._key_positions = {}
+        self._create_table(columns)
+        self.connection.execute('BEGIN')
+
+    def _create_table(self, columns: dict) -> None:
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS %s (identifier TEXT, '
+            'timestamp INTEGER)' % _quote(self.table))
+
+        existing_columns = [row[1] for row in self.connection.execute(
+            'PRAGMA table_info(%s)' % _quote(self.table))]
+        for column in existing_columns[2:]:
+            self._columns.append(column)
+            self._column_positions[column.lower()] = len(self._columns) - 1
+
+        for column, column_type in columns.items():
+            if column.lower() not in self._column_positions:
+                self._add_column(column, column_type)
+
+        self._prepare_insert()
+
+    def _add_column(self, column: str, column_type: str) -> None:
+        self.connection.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+            _quote(self.table), _quote(column), column_type))
+        self._columns.append(column)
+        self._column_positions[column.lower()] = len(self._columns) - 1
+
+    def _prepare_insert(self) -> None:
+        self._row_width = len(self._columns)
+        self._insert_sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            _quote(self.table), ', '.join(map(_quote, self._columns)),
+            ', '.join('?' * len(self._columns)))
+
+    def _key_position(self, key: str, value) -> int:
+        """Get the row position of *key*'s column, adding it if missing."""
+
+        column = _column_name(key)
+        position = self._column_positions.get(column.lower())
+        if position is None:
+            self._flush_batch()
+            self._add_column(column, _infer_column_type([value]))
+            self._prepare_insert()
+            position = self._column_positions[column.lower()]
+
+        self._key_positions[key] = position
+        return position
+
+    def add(self, record: tuple) -> None:
+        identifier, timestamp, key_value_pairs = record
+
+        row = [None] * self._row_width
+        row[0], row[1] = identifier, timestamp
+        for key, value in key_value_pairs:
+            position = self._key_positions.get(key)
+            if position is None:
+                position = self._key_position(key, value)
+                row.extend([None] * (self._row_width - len(row)))
+            row[position] = _to_sql_value(value)
+
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def _flush_batch(self) -> None:
+        if not self._batch:
+            return
+
+        self.connection.executemany(self._insert_sql, self._batch)
+        self.rows_loaded += len(self._batch)
+        self._uncommitted_rows += len(self._batch)
+        self._batch = []
+
+        if self._uncommitted_rows >= self.commit_every:
+            self.connection.execute('COMMIT')
+            self.connection.execute('BEGIN')
+            self._uncommitted_rows = 0
+
+    def finish(self) -> None:
+        self._flush_batch()
+        self.connection.execute('COMMIT')
+
+    def create_index(self, columns: [str]) -> None:
+        index_name = 'idx_%s_%s' % (self.table, '_'.join(columns))
+        self.connection.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' % (
+            _quote(index_name), _quote(self.table),
+            ', '.join(map(_quote, columns))))
+
+
+@click.group()
+def qs_load() -> None:
+    """Bulk loads ".qs" files into something queryable."""
+
+
+@qs_load.command()
+@click.argument('db_path', type=click.Path(dir_okay=False))
+@click.argument('input_qs_paths', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--table', default='qs_records', show_default=True,
+              help='Table to load records into, created if missing.')
+@click.option('--sample-size', type=click.IntRange(min=1), default=10000,
+              show_default=True, help='Rows sampled to infer column types.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=10000,
+              show_default=True, help='Rows per `executemany` batch.')
+@click.option('--commit-every', type=click.IntRange(min=1), default=1000000,
+              show_default=True, help='Rows per transaction.')
+@click.option('--index', 'indexes', multiple=True,
+              help='Column(s) to index after loading, comma-separated for a '
+                   'composite index. Repeatable.')
+@click.option('--jobs', type=click.IntRange(min=1), default=1,
+              show_default=True, help='Processes to parse rows in.')
+def sqlite(db_path, input_qs_paths, table, sample_size, batch_size,
+           commit_every, indexes, jobs) -> None:
+    """Loads ".qs" files into a SQLite database table.
+
+    Top-level keys become columns, typed from a sample of rows. Nested lists
+    and JSON dicts are stored as JSON text. Keys differing only in case share
+    a column, keys named like the `identifier` and `timestamp` columns get
+    `key_` prefixed columns.
+    """
+
+    started_at = time.time()
+    records = _iter_records(input_qs_paths, jobs, batch_size)
+    sampled_records = list(islice(records, sample_size))
+
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            connection.execute(pragma)
+
+        table_loader = _SQLiteTableLoader(
+            connection, table, _infer_columns(sampled_records), batch_size,
+            commit_every)
+        for record in chain(sampled_records, records):
+            table_loader.add(record)
+        table_loader.finish()
+
+        for index in indexes:
+            table_loader.create_index(index.split(','))
+    finally:
+        connection.close()
+
+    print(f'Loaded {table_loader.rows_loaded} rows into {table!r} in '
+          f'{time.time() - started_at:.1f} s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    qs_load()
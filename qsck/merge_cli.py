@@ -0,0 +1,157 @@
+"""Module providing the `qs-merge` command-line tool."""
+
+import heapq
+import sys
+import tempfile
+from itertools import chain
+
+import click
+
+from .util import _open_qs_file, _qs_row_sort_key
+
+# Rough per-row bookkeeping overhead (list slot, bytes header), in bytes.
+_ROW_OVERHEAD = 100
+
+# Max number of spill files merged in one go, keeps open file handles sane.
+_MAX_FAN_IN = 128
+
+
+def _iter_rows(input_qs_path: str, check_sorted: bool = False):
+    """Yield newline-terminated rows from *input_qs_path*, skipping bad ones.
+    """
+
+    previous_key = None
+    with _open_qs_file(input_qs_path) as input_qs_file:
+        for idx, qs_row in enumerate(input_qs_file, 1):
+            if not qs_row.strip():
+                continue
+            if not qs_row.endswith(b'\n'):
+                qs_row += b'\n'
+
+            try:
+                sort_key = _qs_row_sort_key(qs_row)
+            except (AssertionError, ValueError) as key_err:
+                print(f'Error reading row {idx} in {input_qs_path}, '
+                      f'{qs_row!r} ({str(key_err)})', file=sys.stderr)
+                continue
+
+            if check_sorted:
+                # Identifiers within the same second may come in any order.
+                if previous_key is not None and \
+                        sort_key[0] < previous_key[0]:
+                    raise click.ClickException(
+                        f'Row {idx} in {input_qs_path} is out of timestamp '
+                        f'order, run without `--presorted`.')
+                previous_key = sort_key
+
+            yield qs_row
+
+
+def _spill(sorted_rows, tmp_dir: str):
+    """Write *sorted_rows* to a temporary spill file, rewound for reading."""
+
+    spill_file = tempfile.TemporaryFile(mode='w+b', dir=tmp_dir)
+    spill_file.writelines(sorted_rows)
+    spill_file.seek(0)
+    return spill_file
+
+
+def _merge_spill_files(spill_files: list, tmp_dir: str) -> list:
+    """Merge *spill_files* batch-wise until at most `_MAX_FAN_IN` remain."""
+
+    while len(spill_files) > _MAX_FAN_IN:
+        batch, spill_files = spill_files[:_MAX_FAN_IN], \
+            spill_files[_MAX_FAN_IN:]
+        spill_files.append(
+            _spill(heapq.merge(*batch, key=_qs_row_sort_key), tmp_dir))
+        for spill_file in batch:
+            spill_file.close()
+
+    return spill_files
+
+
+def _external_sort(qs_rows, max_memory: int, tmp_dir: str):
+    """Sort *qs_rows* by prefix, spilling sorted runs past *max_memory* bytes.
+    """
+
+    spill_files, run, run_size = [], [], 0
+    for qs_row in qs_rows:
+        run.append(qs_row)
+        run_size += len(qs_row) + _ROW_OVERHEAD
+        if run_size >= max_memory:
+            run.sort(key=_qs_row_sort_key)
+            spill_files.append(_spill(run, tmp_dir))
+            run, run_size = [], 0
+
+    run.sort(key=_qs_row_sort_key)
+    if not spill_files:
+        yield from run
+        return
+
+    if run:
+        spill_files.append(_spill(run, tmp_dir))
+    del run
+
+    spill_files = _merge_spill_files(spill_files, tmp_dir)
+    try:
+        yield from heapq.merge(*spill_files, key=_qs_row_sort_key)
+    finally:
+        for spill_file in spill_files:
+            spill_file.close()
+
+
+def _drop_duplicates(sorted_qs_rows):
+    """Skip rows identical to an earlier row with the same timestamp.
+
+    Rows are only assumed to be in timestamp order, as identifiers within the
+    same second may come in any order with `--presorted`.
+    """
+
+    current_timestamp, seen_rows = None, set()
+    for qs_row in sorted_qs_rows:
+        timestamp, _ = _qs_row_sort_key(qs_row)
+        if timestamp != current_timestamp:
+            current_timestamp, seen_rows = timestamp, set()
+        elif qs_row in seen_rows:
+            continue
+        seen_rows.add(qs_row)
+        yield qs_row
+
+
+@click.command()
+@click.argument('input_qs_paths', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--presorted', is_flag=True,
+              help='Inputs are already timestamp-ordered, k-way merge them.')
+@click.option('--unique', is_flag=True, help='Drop duplicate rows.')
+@click.option('--max-memory', type=click.IntRange(min=1), default=512,
+              show_default=True,
+              help='Memory cap (MiB) for external sorting before spilling.')
+@click.option('--tmp-dir', type=click.Path(exists=True, file_okay=False),
+              default=None, help='Directory for spill files.')
+def qs_merge(input_qs_paths, presorted, unique, max_memory, tmp_dir) -> None:
+    """Merges ".qs" files into one timestamp-ordered stream on stdout.
+
+    Rows are ordered on their `timestamp,identifier` prefix only and passed
+    through verbatim, without deserializing the rest of the row.
+    """
+
+    if presorted:
+        merged_rows = heapq.merge(
+            *[_iter_rows(path, check_sorted=True) for path in input_qs_paths],
+            key=_qs_row_sort_key)
+    else:
+        merged_rows = _external_sort(
+            chain.from_iterable(_iter_rows(path) for path in input_qs_paths),
+            max_memory * 1024 * 1024, tmp_dir)
+
+    if unique:
+        merged_rows = _drop_duplicates(merged_rows)
+
+    output = sys.stdout.buffer
+    output.writelines(merged_rows)
+    output.flush()
+
+
+if __name__ == '__main__':
+    qs_merge()
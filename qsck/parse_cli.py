@@ -1,46 +1,560 @@
 """Module providing the `qs-parse` command-line tool."""
 
-import bz2
-import gzip
-import re
-import traceback
 import sys
+from collections import namedtuple
+from contextlib import nullcontext
+from itertools import islice
 
 import click
-import ujson
 
-from . import deserialize
+from . import codec, deserialize, SegmentCache
+from .util import _open_qs_file, _encode_json_record, _qs_row_sort_key
 
+# Heavier imports (`multiprocessing`, `traceback`, `.bgzf`) are done where
+# needed, to keep one-shot runs on small files quick to start.
 
-@click.command()
-@click.argument('input_qs_path', type=click.Path(exists=True, dir_okay=False))
-def qs_parse(input_qs_path):
-    """Reads ".qs" file, outputs one JSON record per input line to stdout."""
-
-    if input_qs_path.endswith('.qs.bz2'):
-        input_qs_file = bz2.open(input_qs_path, 'rb')
-    elif input_qs_path.endswith('.qs.gz'):
-        input_qs_file = gzip.open(input_qs_path, 'rb')
-    elif input_qs_path.endswith('.qs'):
-        input_qs_file = open(input_qs_path, 'rb')
-    else:
-        raise TypeError(f'Unsupported file suffix for {input_qs_path}, '
-                        f'must be `.qs`, `.qs.bz2` or `.qs.gz`.')
 
-    for idx, qs_row in enumerate(input_qs_file.readlines(), 1):
+def _in_time_range(qs_row: bytes, since: int, until: int) -> bool:
+    try:
+        timestamp, _ = _qs_row_sort_key(qs_row)
+    except (AssertionError, ValueError):
+        return False  # Not known to be in range.
+
+    return (since is None or timestamp >= since) and \
+        (until is None or timestamp <= until)
+
+
+def _check_partition_timestamp(timestamp: str) -> None:
+    try:
+        int(timestamp)
+    except ValueError:
+        raise ValueError(f'Timestamp {timestamp!r} to partition by is not an '
+                         f'epoch timestamp') from None
+
+
+# Options for parsing each row, passed on to worker processes.
+_ParseOptions = namedtuple(
+    '_ParseOptions', 'raw_json since until schema batch_size sampler '
+                     'partition_by')
+
+# Per-process segment cache of `--jobs` worker processes.
+_worker_cache = None
+
+
+def _init_worker_cache(cache_size: int) -> None:
+    global _worker_cache
+    _worker_cache = SegmentCache(cache_size) if cache_size else None
+
+
+def _iter_deserialized_rows(qs_rows, first_line: int, input_qs_path: str,
+                            options: _ParseOptions,
+                            cache: SegmentCache = None):
+    """Deserialize *qs_rows*, yield `(idx, record, error_output)` 3-tuples.
+
+    Rows outside the time range, or not sampled, are skipped unparsed.
+    """
+
+    since, until = options.since, options.until
+    numbered_rows = enumerate(qs_rows, first_line)
+    if since is not None or until is not None:
+        numbered_rows = ((idx, qs_row) for idx, qs_row in numbered_rows
+                         if _in_time_range(qs_row, since, until))
+    if options.sampler is not None:
+        numbered_rows = options.sampler.sample(numbered_rows)
+
+    for idx, qs_row in numbered_rows:
         # noinspection PyBroadException
         try:
-            input_record = deserialize(qs_row.decode('utf-8'))
-            json_output = ujson.dumps(input_record)
-            print(re.sub(r'(\d\.\d+[1-9])0+e\+(\d+)', r'\1E\2', json_output))
+            record = deserialize(qs_row.decode('utf-8'), options.raw_json,
+                                 cache)
+            if options.partition_by:
+                _check_partition_timestamp(record[1])
+            yield idx, record, None
         except Exception:
+            import traceback
+
             exc_type, exc_value, exc_traceback = sys.exc_info()
             exc_value.args = (
                 (f'Error reconstructing pairs from row {idx} in '
                  f'{input_qs_path}, {qs_row!r} ({str(exc_value)})',)
             )
-            print(''.join(traceback.format_exception(
-                exc_type, exc_value, exc_traceback)), file=sys.stderr)
+            yield idx, None, ''.join(traceback.format_exception(
+                exc_type, exc_value, exc_traceback))
+
+
+def _format_null_mask(null_mask: dict, row_numbers: list, schema,
+                      input_qs_path: str) -> str:
+    null_reports = []
+    for path, record_idxs in null_mask.items():
+        nulled_rows = ', '.join(str(row_numbers[record_idx])
+                                for record_idx in record_idxs[:10])
+        if len(record_idxs) > 10:
+            nulled_rows += ', ...'
+        null_reports.append(
+            f'Nulled {len(record_idxs)} invalid {schema.value_types[path]} '
+            f'value(s) of {path!r} in {input_qs_path}, rows {nulled_rows}')
+
+    return '\n'.join(null_reports)
+
+
+def _format_json_output(input_record: tuple, options: _ParseOptions):
+    json_output = _encode_json_record(input_record)
+    if options.partition_by:
+        return input_record[0], input_record[1], json_output
+
+    return json_output
+
+
+def _iter_parsed_rows(qs_rows, first_line: int, input_qs_path: str,
+                      options: _ParseOptions, cache: SegmentCache = None):
+    """Deserialize *qs_rows*, yield `(json_output, error_output)` 2-tuples.
+
+    With a schema, records are coerced to it in batches before output. When
+    partitioning output, JSON output comes with its row's identifier and
+    timestamp, as `(identifier, timestamp, json_output)`.
+    """
+
+    parsed_rows = _iter_deserialized_rows(qs_rows, first_line, input_qs_path,
+                                          options, cache)
+    if options.schema is None:
+        for _, input_record, error_output in parsed_rows:
+            if error_output is None:
+                yield _format_json_output(input_record, options), None
+            else:
+                yield None, error_output
+        return
+
+    while True:
+        batch = list(islice(parsed_rows, options.batch_size))
+        if not batch:
+            return
+
+        row_numbers, input_records = [], []
+        for idx, input_record, error_output in batch:
+            if error_output is None:
+                row_numbers.append(idx)
+                input_records.append(input_record)
+            else:
+                yield None, error_output
+
+        input_records, null_mask = options.schema.coerce(input_records)
+        for input_record in input_records:
+            yield _format_json_output(input_record, options), None
+        if null_mask:
+            yield None, _format_null_mask(null_mask, row_numbers,
+                                          options.schema, input_qs_path)
+
+
+def _parse_block(block_args: tuple, cache: SegmentCache = None) -> tuple:
+    """Parse a ".qs.bgz" block, return parsed rows and cache hits/misses."""
+
+    from .bgzf import read_block
+
+    input_qs_path, block, options = block_args
+    if cache is None:
+        cache = _worker_cache
+    hits, misses = (cache.hits, cache.misses) if cache is not None \
+        else (0, 0)
+
+    parsed_rows = list(_iter_parsed_rows(
+        read_block(input_qs_path, block), block['first_line'], input_qs_path,
+        options, cache))
+
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return parsed_rows, hits, misses
+
+
+def _iter_parsed_blocks(input_qs_path: str, blocks: list, jobs: int,
+                        options: _ParseOptions, cache: SegmentCache = None):
+    """Decompress and parse ".qs.bgz" *blocks* in *jobs* processes, in order.
+    """
+
+    since, until = options.since, options.until
+    blocks = [block for block in blocks
+              if (since is None or block['max_timestamp'] >= since) and
+              (until is None or block['min_timestamp'] <= until)]
+    blocks_args = [(input_qs_path, block, options) for block in blocks]
+
+    if jobs == 1:
+        for block_args in blocks_args:
+            yield from _parse_block(block_args, cache)[0]
+        return
+
+    from multiprocessing import Pool
+
+    with Pool(jobs, _init_worker_cache,
+              (cache.maxsize if cache is not None else 0,)) as pool:
+        for parsed_rows, hits, misses in pool.imap(_parse_block, blocks_args):
+            if cache is not None:
+                # Tally up worker cache stats.
+                cache.hits += hits
+                cache.misses += misses
+            yield from parsed_rows
+
+
+def _iter_parsed_path(input_qs_path: str, jobs: int, options: _ParseOptions,
+                      cache: SegmentCache = None):
+    """Parse a ".qs" file, yield `(json_output, error_output)` 2-tuples."""
+
+    blocks = None
+    if input_qs_path.endswith('.qs.bgz'):
+        from .bgzf import read_block_table
+        blocks = read_block_table(input_qs_path)
+
+    # Reservoir samples are picked from the whole file, not block by block.
+    if blocks is not None and \
+            (options.sampler is None or options.sampler.size is None):
+        yield from _iter_parsed_blocks(input_qs_path, blocks, jobs, options,
+                                       cache)
+    else:
+        with _open_qs_file(input_qs_path) as input_qs_file:
+            yield from _iter_parsed_rows(input_qs_file, 1, input_qs_path,
+                                         options, cache)
+
+
+# Errors of files that are missing, unreadable or not validly compressed.
+_READ_ERRORS = (OSError, TypeError, EOFError)
+
+
+def _format_read_error(input_qs_path: str, read_err: Exception) -> str:
+    return f'Error reading {input_qs_path} ({str(read_err)})'
+
+
+def _parse_path(path_args: tuple) -> (str, str, bool, int, int):
+    """Parse a whole ".qs" file in a worker process.
+
+    Returns the stdout and stderr output, whether the file could be read, and
+    cache hits/misses. When partitioning output, stdout output is a list of
+    JSON outputs with their identifiers and timestamps instead.
+    """
+
+    input_qs_path, options = path_args
+    json_outputs, error_outputs, read_ok = [], [], True
+    hits, misses = (_worker_cache.hits, _worker_cache.misses) \
+        if _worker_cache is not None else (0, 0)
+    try:
+        for json_output, error_output in _iter_parsed_path(
+                input_qs_path, 1, options, _worker_cache):
+            if error_output is None:
+                json_outputs.append(json_output)
+            else:
+                error_outputs.append(error_output + '\n')
+    except _READ_ERRORS as read_err:
+        error_outputs.append(_format_read_error(input_qs_path, read_err) +
+                             '\n')
+        read_ok = False
+
+    if not options.partition_by:
+        json_outputs = ''.join(json_output + '\n'
+                               for json_output in json_outputs)
+    if _worker_cache is not None:
+        hits = _worker_cache.hits - hits
+        misses = _worker_cache.misses - misses
+    return json_outputs, ''.join(error_outputs), read_ok, hits, misses
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """Remove a socket left behind at *socket_path* by a server that's gone.
+
+    Refuses to remove anything else, or the socket of a live server.
+    """
+
+    import os
+    import socket
+    import stat
+
+    try:
+        path_mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(path_mode):
+        raise click.ClickException(f'{socket_path} exists and is not a '
+                                   f'socket, not serving on it.')
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)  # Nothing listening, left behind.
+        else:
+            raise click.ClickException(f'A server is already listening on '
+                                       f'{socket_path}.')
+
+
+def _make_server(socket_path: str, pool, options: _ParseOptions):
+    """Make a Unix socket server parsing requested paths in the *pool*.
+
+    Clients send absolute paths, one per line, then shut down writing. The
+    server streams back frames of a channel byte (`o` stdout, `e` stderr, `x`
+    exit status) and a 4-byte big-endian payload length, see `qsck.client`.
+    """
+
+    import socketserver
+    import struct
+
+    class _ParseRequestHandler(socketserver.StreamRequestHandler):
+
+        def _send(self, channel: bytes, payload: str) -> None:
+            payload = payload.encode('utf-8')
+            self.wfile.write(struct.pack('!cI', channel, len(payload)))
+            self.wfile.write(payload)
+
+        def handle(self) -> None:
+            input_qs_paths = [line.decode('utf-8').rstrip('\n')
+                              for line in self.rfile if line.strip()]
+
+            exit_status = 0
+            for json_output, error_output, read_ok, _, __ in pool.imap(
+                    _parse_path, [(input_qs_path, options)
+                                  for input_qs_path in input_qs_paths]):
+                if json_output:
+                    self._send(b'o', json_output)
+                if error_output:
+                    self._send(b'e', error_output)
+                if not read_ok:
+                    exit_status = 1
+
+            self._send(b'x', str(exit_status))
+
+    _remove_stale_socket(socket_path)
+    return socketserver.ThreadingUnixStreamServer(socket_path,
+                                                  _ParseRequestHandler)
+
+
+def _load_schema(schema_path: str):
+    from .schema import Schema
+
+    with open(schema_path) as schema_file:
+        try:
+            return Schema(codec.loads(schema_file.read()))
+        except ValueError as schema_err:
+            raise click.BadParameter(str(schema_err), param_hint='--schema')
+
+
+def _infer_schema(input_qs_path: str, sample_size: int, raw_json: bool):
+    """Infer a schema from the first *sample_size* rows of *input_qs_path*.
+    """
+
+    from . import iter_deserialize
+    from .schema import Schema
+
+    with _open_qs_file(input_qs_path) as input_qs_file:
+        return Schema.infer(list(islice(iter_deserialize(
+            input_qs_file, raw_json, on_error=lambda *_: None), sample_size)))
+
+
+def _parse_paths(input_qs_paths: tuple, jobs: int, cache_size: int,
+                 options: _ParseOptions, cache: SegmentCache, writer) -> bool:
+    """Parse *input_qs_paths* into *writer* partitions, or to stdout.
+
+    Files that can't be read are reported and skipped, returns whether all
+    could be.
+    """
+
+    all_read_ok = True
+    if len(input_qs_paths) > 1 and jobs > 1:
+        from multiprocessing import Pool
+
+        with Pool(jobs, _init_worker_cache, (cache_size,)) as pool:
+            for json_outputs, error_output, read_ok, hits, misses in pool.imap(
+                    _parse_path, [(input_qs_path, options)
+                                  for input_qs_path in input_qs_paths]):
+                if cache is not None:
+                    # Tally up worker cache stats.
+                    cache.hits += hits
+                    cache.misses += misses
+                if writer is not None:
+                    for json_output in json_outputs:
+                        writer.write_line(*json_output)
+                else:
+                    sys.stdout.write(json_outputs)
+                sys.stderr.write(error_output)
+                all_read_ok &= read_ok
+        return all_read_ok
+
+    for input_qs_path in input_qs_paths:
+        try:
+            for json_output, error_output in _iter_parsed_path(
+                    input_qs_path, jobs, options, cache):
+                if error_output is not None:
+                    print(error_output, file=sys.stderr)
+                elif writer is not None:
+                    writer.write_line(*json_output)
+                else:
+                    print(json_output)
+        except _READ_ERRORS as read_err:
+            print(_format_read_error(input_qs_path, read_err),
+                  file=sys.stderr)
+            all_read_ok = False
+
+    return all_read_ok
+
+
+def _serve(socket_path: str, jobs: int, cache_size: int,
+           options: _ParseOptions) -> None:
+    import os
+    from multiprocessing import Pool
+
+    with Pool(jobs, _init_worker_cache, (cache_size,)) as pool:
+        server = _make_server(socket_path, pool, options)
+        print(f'Serving qs-parse on {socket_path} with {jobs} workers',
+              file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(socket_path)
+
+
+@click.command()
+@click.argument('input_qs_paths', nargs=-1,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--raw-json', is_flag=True,
+              help='Pass nested dict values through as verbatim JSON text.')
+@click.option('--since', type=int, default=None,
+              help='Only rows with timestamps at or after this epoch time.')
+@click.option('--until', type=int, default=None,
+              help='Only rows with timestamps at or before this epoch time.')
+@click.option('--jobs', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help='Processes to parse files, or a single file\'s `.qs.bgz` '
+                   'blocks, in.')
+@click.option('--cache-size', type=click.IntRange(min=0), default=0,
+              show_default=True,
+              help='Memoize up to this many parsed nested `={...}` values.')
+@click.option('--cache-stats', is_flag=True,
+              help='Print nested value cache hit rate to stderr when done.')
+@click.option('--schema', 'schema_path',
+              type=click.Path(exists=True, dir_okay=False), default=None,
+              help='JSON file mapping key paths to `int`, `float`, `bool`, '
+                   '`epoch_ms` or `str`, to output typed values.')
+@click.option('--infer-schema', is_flag=True,
+              help='Infer the schema from the first batch of rows.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=10000,
+              show_default=True, help='Rows per schema coercion batch.')
+@click.option('--sample', 'sample_rate', type=click.FloatRange(0, 1),
+              default=None,
+              help='Only parse this fraction of rows, picked at random.')
+@click.option('--sample-n', 'sample_size', type=click.IntRange(min=1),
+              default=None,
+              help='Only parse this many rows per file, picked at random.')
+@click.option('--stratify', is_flag=True,
+              help='Pick `--sample-n` rows per identifier.')
+@click.option('--seed', type=int, default=0, show_default=True,
+              help='Seed for picking sampled rows.')
+@click.option('--output-dir', type=click.Path(file_okay=False), default=None,
+              help='Write output into one file per partition in this '
+                   'directory, instead of to stdout.')
+@click.option('--partition-by', default='identifier,hour', show_default=True,
+              help='Comma-separated `identifier`, `hour` and/or `day` fields '
+                   'to partition `--output-dir` files by.')
+@click.option('--compression', type=click.Choice(['gzip', 'bz2']),
+              default=None, help='Compression of `--output-dir` files.')
+@click.option('--max-open-files', type=click.IntRange(min=1), default=128,
+              show_default=True,
+              help='Most `--output-dir` files to keep open at a time.')
+@click.option('--json-codec', type=click.Choice(['auto'] + list(codec.CODECS)),
+              default=None,
+              help='JSON codec to use, by default the fastest installed one, '
+                   f'or `${codec.CODEC_ENV_VAR}`.')
+@click.option('--stdin-paths', is_flag=True,
+              help='Read paths of files to parse from stdin, one per line.')
+@click.option('--serve', 'socket_path', type=click.Path(dir_okay=False),
+              default=None,
+              help='Serve parse requests from `qs-parse-client` on this Unix '
+                   'socket, with `--jobs` warm worker processes.')
+def qs_parse(input_qs_paths, raw_json, since, until, jobs, cache_size,
+             cache_stats, schema_path, infer_schema, batch_size, sample_rate,
+             sample_size, stratify, seed, output_dir, partition_by,
+             compression, max_open_files, json_codec, stdin_paths,
+             socket_path):
+    """Reads ".qs" files, outputs one JSON record per input line to stdout.
+
+    For `.qs.bgz` files with a block table, blocks outside the `--since` and
+    `--until` range are skipped without being decompressed.
+
+    Sampled rows are picked before parsing, from a hash of the raw row seeded
+    by `--seed`, so parse time scales with the sample size.
+
+    With `--output-dir`, output is split into ".json" files per partition,
+    which only get their final names once all input is parsed.
+    """
+
+    if json_codec is not None:
+        import os
+
+        try:
+            codec.set_codec(json_codec)
+        except ValueError as codec_err:
+            raise click.BadParameter(str(codec_err), param_hint='--json-codec')
+        os.environ[codec.CODEC_ENV_VAR] = json_codec  # For worker processes.
+
+    sampler = None
+    if sample_rate is not None or sample_size is not None or stratify:
+        from .sampling import RowSampler
+
+        try:
+            sampler = RowSampler(sample_rate, sample_size, stratify, seed)
+        except ValueError as sample_err:
+            raise click.UsageError(
+                f'{sample_err}, pass one of `--sample` and `--sample-n`.')
+
+    schema = None
+    if schema_path is not None:
+        schema = _load_schema(schema_path)
+
+    if socket_path is not None:
+        if output_dir is not None or infer_schema:
+            raise click.UsageError('`--serve` can\'t be used with '
+                                   '`--output-dir` or `--infer-schema`.')
+        options = _ParseOptions(raw_json, since, until, schema, batch_size,
+                                sampler, None)
+        return _serve(socket_path, jobs, cache_size, options)
+
+    if stdin_paths:
+        input_qs_paths += tuple(line.rstrip('\n') for line in sys.stdin
+                                if line.strip())
+    if not input_qs_paths:
+        raise click.UsageError('No input files, pass paths as arguments, or '
+                               'use `--stdin-paths` or `--serve`.')
+
+    if infer_schema and schema is None:
+        schema = _infer_schema(input_qs_paths[0], batch_size, raw_json)
+        print(f'Inferred schema {codec.dumps(schema.to_dict())}',
+              file=sys.stderr)
+
+    writer = None
+    if output_dir is not None:
+        from .writer import PartitionedWriter
+
+        suffix = {None: '.json', 'gzip': '.json.gz', 'bz2': '.json.bz2'}
+        partition_fields = [field.strip() for field in partition_by.split(',')]
+        try:
+            writer = PartitionedWriter(output_dir, partition_fields,
+                                       suffix[compression], compression,
+                                       max_open_files)
+        except ValueError as partition_err:
+            raise click.BadParameter(str(partition_err),
+                                     param_hint='--partition-by')
+
+    options = _ParseOptions(
+        raw_json, since, until, schema, batch_size, sampler,
+        writer.partition_by if writer is not None else None)
+    cache = SegmentCache(cache_size) if cache_size else None
+
+    with writer if writer is not None else nullcontext():
+        all_read_ok = _parse_paths(input_qs_paths, jobs, cache_size, options,
+                                   cache, writer)
+
+    if cache_stats and cache is not None:
+        print(f'Nested value cache: {cache.hits} hits, {cache.misses} misses '
+              f'({cache.hit_rate:.1%} hit rate)', file=sys.stderr)
+    if not all_read_ok:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
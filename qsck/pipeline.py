@@ -0,0 +1,319 @@
+"""Composable, lazy pipelines over ".qs" files.
+
+    qsck.read(paths).where(identifier='LOG').select('a', 'b').map(fn) \
+        .write('out.qs.gz')
+
+Each stage returns a new `Pipeline`, nothing is read until it's iterated or
+written. `where` conditions on the identifier or timestamp only need a row's
+prefix, and as long as no `map` stage comes before them, they're checked on
+the raw row so filtered out rows are never deserialized. Rows with an
+identifier or timestamp that can't be parsed never match them. With `jobs > 1`,
+files are run through the pipeline in that many processes, so functions
+passed to `where`, `map` and as `on_error` must then be picklable, e.g.
+module-level.
+
+Rows that can't be deserialized are reported on stderr with their path and
+line number and skipped, or passed to an `on_error` callback instead.
+
+`Pipeline.stats` holds per-stage row counts and timings of the last run, rows
+skipped as errors are those in but not out of the `deserialize` stage.
+"""
+
+from time import perf_counter
+
+from .cache import SegmentCache
+from .core import deserialize
+from .util import _open_qs_file, _print_parse_error, _qs_row_sort_key
+
+
+class StageStats:
+    """Rows in and out of a pipeline stage, and time spent in it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows_in = 0
+        self.rows_out = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_in / self.seconds if self.seconds else 0.0
+
+    def add(self, other) -> None:
+        self.rows_in += other.rows_in
+        self.rows_out += other.rows_out
+        self.seconds += other.seconds
+
+    def __repr__(self) -> str:
+        return (f'<StageStats {self.name}: {self.rows_in} in, '
+                f'{self.rows_out} out, {self.rows_per_second:.0f} rows/s>')
+
+
+class _HeaderFilter:
+    """`where` condition on the identifier and/or timestamp of rows."""
+
+    header_only = True
+
+    def __init__(self, identifier, since: int, until: int):
+        if isinstance(identifier, str):
+            identifier = (identifier,)
+        self.identifiers = set(identifier) if identifier is not None \
+            else None
+        self.raw_identifiers = {identifier.encode('utf-8')
+                                for identifier in self.identifiers} \
+            if self.identifiers is not None else None
+        self.since = since
+        self.until = until
+        self.name = 'where(' + ', '.join(
+            f'{arg}={value!r}' for arg, value in (
+                ('identifier', identifier), ('since', since),
+                ('until', until)) if value is not None) + ')'
+
+    def _matches(self, identifiers: set, identifier, timestamp: int) -> bool:
+        return (identifiers is None or identifier in identifiers) and \
+            (self.since is None or timestamp >= self.since) and \
+            (self.until is None or timestamp <= self.until)
+
+    def matches_row(self, timestamp: int, identifier: bytes) -> bool:
+        return self._matches(self.raw_identifiers, identifier, timestamp)
+
+    def __call__(self, record: tuple):
+        identifier, timestamp, _ = record
+        try:
+            timestamp = int(timestamp)
+        except (TypeError, ValueError):
+            return None  # Like rows with a prefix that can't be parsed.
+
+        if self._matches(self.identifiers, identifier, timestamp):
+            return record
+
+
+class _RecordFilter:
+    header_only = False
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.name = f'where({getattr(predicate, "__name__", predicate)})'
+
+    def __call__(self, record: tuple):
+        if self.predicate(record):
+            return record
+
+
+class _Select:
+    header_only = False
+
+    def __init__(self, keys: tuple):
+        self.keys = frozenset(keys)
+        self.name = f'select({", ".join(map(repr, keys))})'
+
+    def __call__(self, record: tuple):
+        identifier, timestamp, key_value_pairs = record
+        return identifier, timestamp, [
+            (key, value) for key, value in key_value_pairs
+            if key in self.keys]
+
+
+class _Map:
+    header_only = False
+
+    def __init__(self, func):
+        self.func = func
+        self.name = f'map({getattr(func, "__name__", func)})'
+
+    def __call__(self, record: tuple):
+        return self.func(record)
+
+
+def _fuse_header_filters(stages: tuple) -> (list, list):
+    """Split *stages* into header filters to check on raw rows, and the rest.
+
+    Header filters can't be moved before a `map`, which may change headers.
+    """
+
+    fused_filters, record_stages = [], []
+    for stage in stages:
+        if isinstance(stage, _HeaderFilter) and \
+                not any(isinstance(record_stage, _Map)
+                        for record_stage in record_stages):
+            fused_filters.append(stage)
+        else:
+            record_stages.append(stage)
+
+    return fused_filters, record_stages
+
+
+def _iter_path(pipeline, input_qs_path: str, all_stats: list):
+    """Run a single file through *pipeline*, tallying up *all_stats*."""
+
+    fused_filters, record_stages = _fuse_header_filters(pipeline.stages)
+    read_stats, parse_stats = all_stats[:2]
+    cache = SegmentCache(pipeline.cache_size) if pipeline.cache_size \
+        else None
+
+    with _open_qs_file(input_qs_path) as input_qs_file:
+        for idx, qs_row in enumerate(input_qs_file, 1):
+            started = perf_counter()
+            read_stats.rows_in += 1
+            if not qs_row.strip():
+                read_stats.seconds += perf_counter() - started
+                continue
+
+            if fused_filters:
+                try:
+                    timestamp, identifier = _qs_row_sort_key(qs_row)
+                    matches = all(header_filter.matches_row(timestamp,
+                                                            identifier)
+                                  for header_filter in fused_filters)
+                except (AssertionError, ValueError):
+                    matches = False
+                if not matches:
+                    read_stats.seconds += perf_counter() - started
+                    continue
+            read_stats.rows_out += 1
+
+            parsed = perf_counter()
+            read_stats.seconds += parsed - started
+            parse_stats.rows_in += 1
+            try:
+                record = deserialize(qs_row.decode('utf-8'),
+                                     pipeline.raw_json, cache)
+            except Exception as parse_err:
+                parse_stats.seconds += perf_counter() - parsed
+                pipeline.on_error(input_qs_path, idx, qs_row, parse_err)
+                continue
+            parse_stats.rows_out += 1
+            parse_stats.seconds += perf_counter() - parsed
+
+            for stage, stage_stats in zip(record_stages, all_stats[2:]):
+                started = perf_counter()
+                record = stage(record)
+                stage_stats.rows_in += 1
+                stage_stats.seconds += perf_counter() - started
+                if record is None:
+                    break
+                stage_stats.rows_out += 1
+            else:
+                yield record
+
+
+def _run_path(path_args: tuple) -> (list, list):
+    """Run a whole file through a pipeline in a worker process."""
+
+    pipeline, input_qs_path = path_args
+    all_stats = pipeline._make_stats()
+    records = list(_iter_path(pipeline, input_qs_path, all_stats))
+
+    return records, all_stats
+
+
+class Pipeline:
+    """Lazy chain of stages over the rows of ".qs" files, see `qsck.read`."""
+
+    def __init__(self, input_qs_paths: [str], raw_json: bool = False,
+                 cache_size: int = 0, jobs: int = 1, stages: tuple = (),
+                 on_error=None):
+        self.input_qs_paths = list(input_qs_paths)
+        self.raw_json = raw_json
+        self.cache_size = cache_size
+        self.jobs = jobs
+        self.stages = stages
+        self.on_error = on_error if on_error is not None \
+            else _print_parse_error
+        self.stats = []
+
+    def _then(self, *stages):
+        return Pipeline(self.input_qs_paths, self.raw_json, self.cache_size,
+                        self.jobs, self.stages + stages, self.on_error)
+
+    def where(self, predicate=None, *, identifier=None, since: int = None,
+              until: int = None):
+        """Keep records with an *identifier* (or any of several) and epoch
+        timestamp between *since* and *until*, for which *predicate* holds.
+        """
+
+        stages = ()
+        if identifier is not None or since is not None or until is not None:
+            stages += (_HeaderFilter(identifier, since, until),)
+        if predicate is not None:
+            stages += (_RecordFilter(predicate),)
+
+        return self._then(*stages)
+
+    def select(self, *keys: str):
+        """Keep only top-level key-value pairs of these *keys*."""
+
+        return self._then(_Select(keys))
+
+    def map(self, func):
+        """Transform records with *func*, dropping those it returns `None` for.
+        """
+
+        return self._then(_Map(func))
+
+    def _make_stats(self) -> [StageStats]:
+        _, record_stages = _fuse_header_filters(self.stages)
+        fused_names = [stage.name for stage in self.stages
+                       if stage not in record_stages]
+
+        return [StageStats(' + '.join(['read'] + fused_names)),
+                StageStats('deserialize')] + \
+            [StageStats(stage.name) for stage in record_stages]
+
+    def __iter__(self):
+        self.stats = all_stats = self._make_stats()
+        if self.jobs == 1 or len(self.input_qs_paths) < 2:
+            for input_qs_path in self.input_qs_paths:
+                yield from _iter_path(self, input_qs_path, all_stats)
+            return
+
+        from multiprocessing import Pool
+
+        with Pool(self.jobs) as pool:
+            for records, path_stats in pool.imap(
+                    _run_path, [(self, input_qs_path)
+                                for input_qs_path in self.input_qs_paths]):
+                for stage_stats, worker_stage_stats in zip(all_stats,
+                                                           path_stats):
+                    stage_stats.add(worker_stage_stats)
+                yield from records
+
+    def write(self, sink) -> int:
+        """Run the pipeline into *sink*, a path to write a ".qs" file to, or
+        a writer like `QsWriter` or `PartitionedWriter`. Returns rows written.
+        """
+
+        from .writer import QsWriter
+
+        if isinstance(sink, str):
+            with QsWriter(sink) as qs_writer:
+                return self.write(qs_writer)
+
+        write_stats = StageStats('write')
+        for record in self:
+            started = perf_counter()
+            sink.write(*record)
+            write_stats.seconds += perf_counter() - started
+            write_stats.rows_in += 1
+            write_stats.rows_out += 1
+        self.stats.append(write_stats)
+
+        return write_stats.rows_out
+
+
+def read(input_qs_paths, raw_json: bool = False, cache_size: int = 0,
+         jobs: int = 1, on_error=None) -> Pipeline:
+    """Start a `Pipeline` reading records from ".qs" files.
+
+    *input_qs_paths* is a path or a list of them. Records are deserialized as
+    by `deserialize(..., raw_json)`, with a `SegmentCache` of *cache_size*
+    if given, and files are processed in *jobs* processes. Rows that can't be
+    are skipped, after calling `on_error(input_qs_path, row_number, qs_row,
+    exception)`, by default reporting them on stderr.
+    """
+
+    if isinstance(input_qs_paths, str):
+        input_qs_paths = [input_qs_paths]
+
+    return Pipeline(input_qs_paths, raw_json, cache_size, jobs,
+                    on_error=on_error)
@@ -0,0 +1,93 @@
+"""Deterministic sampling of raw ".qs" rows, ahead of deserializing them.
+
+Each row gets a pseudo-random priority in `[0, 1)` from a seeded hash of its
+own bytes. Bernoulli sampling keeps rows whose priority is below the rate,
+reservoir sampling keeps the `size` rows with the lowest priorities, either
+overall or per identifier. The same seed thus picks the same rows no matter
+how input is split into files, blocks or worker processes.
+"""
+
+import heapq
+from hashlib import blake2b
+
+_PRIORITY_SCALE = 2 ** 64
+
+
+def _row_priority(qs_row, key: bytes) -> float:
+    if isinstance(qs_row, str):
+        qs_row = qs_row.encode('utf-8')
+
+    row_hash = blake2b(qs_row.rstrip(b'\r\n'), digest_size=8, key=key)
+
+    return int.from_bytes(row_hash.digest(), 'big') / _PRIORITY_SCALE
+
+
+def _row_identifier(qs_row):
+    return qs_row.split(b',' if isinstance(qs_row, bytes) else ',', 1)[0]
+
+
+class RowSampler:
+    """Samples rows at a *rate*, or a reservoir of *size* rows.
+
+    With *stratify*, *size* rows are kept per row identifier.
+    """
+
+    def __init__(self, rate: float = None, size: int = None,
+                 stratify: bool = False, seed: int = 0):
+        if (rate is None) == (size is None):
+            raise ValueError('Sample at either a rate or a size')
+        if rate is not None and not 0 <= rate <= 1:
+            raise ValueError(f'Sample rate {rate} not between 0 and 1')
+        if stratify and size is None:
+            raise ValueError('Stratified sampling needs a sample size')
+
+        self.rate = rate
+        self.size = size
+        self.stratify = stratify
+        self.seed = seed
+
+    @property
+    def _key(self) -> bytes:
+        return str(self.seed).encode('ascii')
+
+    def sample(self, numbered_rows):
+        """Sample `(row_number, qs_row)` pairs, yielding those kept in order.
+
+        Bernoulli samples are yielded as they come, reservoir samples once
+        *numbered_rows* is exhausted.
+        """
+
+        key = self._key
+        if self.rate is not None:
+            for row_number, qs_row in numbered_rows:
+                if _row_priority(qs_row, key) < self.rate:
+                    yield row_number, qs_row
+            return
+
+        # Max-heaps of the `size` lowest priorities, by negating them.
+        reservoirs = {}
+        for row_number, qs_row in numbered_rows:
+            reservoir = reservoirs.setdefault(
+                _row_identifier(qs_row) if self.stratify else None, [])
+            priority = _row_priority(qs_row, key)
+            if len(reservoir) < self.size:
+                heapq.heappush(reservoir, (-priority, row_number, qs_row))
+            elif -reservoir[0][0] > priority:
+                heapq.heapreplace(reservoir, (-priority, row_number, qs_row))
+
+        sampled_rows = sorted(
+            (row_number, qs_row) for reservoir in reservoirs.values()
+            for _, row_number, qs_row in reservoir)
+        yield from sampled_rows
+
+
+def sample_rows(qs_rows, rate: float = None, size: int = None,
+                stratify: bool = False, seed: int = 0):
+    """Sample an iterable of raw `qs_rows`, lazily yielding those kept.
+
+    Pipe the result into `iter_deserialize` to only parse sampled rows.
+    """
+
+    sampler = RowSampler(rate, size, stratify, seed)
+    for _, qs_row in sampler.sample(enumerate(qs_rows, 1)):
+        yield qs_row
@@ -0,0 +1,159 @@
+"""Schema-driven typed value coercion of deserialized .qs records.
+
+A schema maps key paths to value types. Top-level keys are paths as is,
+sub-keys of nested lists and dicts are dot-joined onto their parent's path,
+e.g. `event_vars.batteryPct` or `event6_vars.networkInfo.roaming`. Types are
+`int`, `float`, `bool`, `epoch_ms` (int milliseconds, from year 2000 on) and
+`str`.
+
+Coercion is done column-wise over batches of records. Values that don't fit
+their type, infinite and NaN floats included, become `None`, and are reported
+in a null mask rather than raised.
+"""
+
+from math import isfinite
+from re import compile as re_compile
+
+from .util import RawJSON
+
+VALUE_TYPES = ('int', 'float', 'bool', 'epoch_ms', 'str')
+
+_INT_PATTERN = re_compile(r'-?\d+$')
+_FLOAT_PATTERN = re_compile(r'-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+_BOOL_VALUES = {'true': True, 'false': False}
+
+# Year 2000 in epoch milliseconds, same lower bound as serialize uses.
+_Y2K_EPOCH_MS = 946684800000
+
+
+def _iter_value_slots(key_value_pairs: list, path_prefix: str = ''):
+    """Yield `(path, container, slot, value)` of all scalar values, nested
+    ones included, where `container[slot]` holds the value or its pair.
+    """
+
+    for idx, (key, value) in enumerate(key_value_pairs):
+        path = path_prefix + key
+        if isinstance(value, RawJSON):
+            continue
+        elif isinstance(value, list):
+            yield from _iter_value_slots(value, path + '.')
+        elif isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                if not isinstance(sub_value, (list, dict)):
+                    yield path + '.' + sub_key, value, sub_key, sub_value
+        else:
+            yield path, key_value_pairs, idx, value
+
+
+def _set_slot(container, slot, value) -> None:
+    if isinstance(container, dict):
+        container[slot] = value
+    else:
+        container[slot] = (container[slot][0], value)
+
+
+def _coerce_str_column(values: list, value_type: str) -> list:
+    """Coerce *values*, `None` for those that don't fit."""
+
+    if value_type == 'bool':
+        return [_BOOL_VALUES.get(value.lower()) for value in values]
+
+    cast = float if value_type == 'float' else int
+    coerced_values = []
+    for value in values:
+        try:
+            value = cast(value)
+        except ValueError:
+            value = None
+        else:
+            if value_type == 'epoch_ms' and value < _Y2K_EPOCH_MS or \
+                    value_type == 'float' and not isfinite(value):
+                value = None
+        coerced_values.append(value)
+
+    return coerced_values
+
+
+def _infer_value_type(values: list) -> str:
+    """Infer the narrowest type fitting all sampled string *values*."""
+
+    if all(value.lower() in _BOOL_VALUES for value in values):
+        return 'bool'
+    elif all(_INT_PATTERN.match(value) for value in values):
+        if all(len(value) == 13 and int(value) >= _Y2K_EPOCH_MS
+               for value in values):
+            return 'epoch_ms'
+        return 'int'
+    elif all(_FLOAT_PATTERN.match(value) for value in values):
+        return 'float'
+    else:
+        return 'str'
+
+
+class Schema:
+    """Key path to value type mapping, coercing batches of records."""
+
+    def __init__(self, value_types: dict):
+        for path, value_type in value_types.items():
+            if value_type not in VALUE_TYPES:
+                raise ValueError(f'Unsupported type {value_type!r} for '
+                                 f'{path!r}, must be one of {VALUE_TYPES}')
+        self.value_types = dict(value_types)
+
+    @classmethod
+    def infer(cls, records: list):
+        """Infer a schema from a sample of deserialized *records*.
+
+        Only key paths with non-`str` values make it into the schema.
+        """
+
+        sampled_values, typed_paths = {}, set()
+        for _, __, key_value_pairs in records:
+            for path, _, __, value in _iter_value_slots(key_value_pairs):
+                if isinstance(value, str):
+                    sampled_values.setdefault(path, []).append(value)
+                elif value is not None:  # Already typed, e.g. JSON numbers.
+                    typed_paths.add(path)
+
+        value_types = {}
+        for path, values in sampled_values.items():
+            if path not in typed_paths:
+                value_type = _infer_value_type(values)
+                if value_type != 'str':
+                    value_types[path] = value_type
+
+        return cls(value_types)
+
+    def coerce(self, records: list) -> (list, dict):
+        """Coerce values of *records* in place, column by column.
+
+        Returns the records, and a null mask mapping key paths to indexes of
+        the records holding values that didn't fit their type.
+        """
+
+        columns = {}
+        for record_idx, (_, __, key_value_pairs) in enumerate(records):
+            for path, container, slot, value in _iter_value_slots(
+                    key_value_pairs):
+                if isinstance(value, str) and path in self.value_types:
+                    columns.setdefault(path, []).append(
+                        (record_idx, container, slot, value))
+
+        null_mask = {}
+        for path, column in columns.items():
+            value_type = self.value_types[path]
+            if value_type == 'str':
+                continue
+
+            coerced_values = _coerce_str_column(
+                [value for _, __, ___, value in column], value_type)
+            for (record_idx, container, slot, _), coerced_value in zip(
+                    column, coerced_values):
+                _set_slot(container, slot, coerced_value)
+                if coerced_value is None:
+                    null_mask.setdefault(path, []).append(record_idx)
+
+        return records, null_mask
+
+    def to_dict(self) -> dict:
+        return dict(self.value_types)
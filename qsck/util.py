@@ -1,9 +1,70 @@
 """Misc utility functions to make serialize/deserialize work."""
 
+import bz2
+import gzip
+import sys
+from collections import OrderedDict
 from datetime import datetime, timezone
 from re import match
 
-import ujson
+from . import codec
+
+
+class RawJSON(str):
+    """Verbatim JSON text of a nested dict value, passed through unparsed."""
+
+
+def _encode_json_record(record: tuple) -> str:
+    """JSON-encode a deserialized *record*, splicing in `RawJSON` values."""
+
+    identifier, timestamp, key_value_pairs = record
+    if not any(isinstance(value, RawJSON) for _, value in key_value_pairs):
+        return codec.dumps(record)
+
+    encoded_pairs = []
+    for key, value in key_value_pairs:
+        if isinstance(value, RawJSON):
+            encoded_pairs.append('[%s,%s]' % (codec.dumps(key), value))
+        else:
+            encoded_pairs.append(codec.dumps((key, value)))
+
+    return '[%s,%s,[%s]]' % (codec.dumps(identifier), codec.dumps(timestamp),
+                             ','.join(encoded_pairs))
+
+
+def _open_qs_file(input_qs_path: str):
+    """Open ".qs" file at *input_qs_path* for binary reading, by suffix."""
+
+    if input_qs_path.endswith('.qs.bz2'):
+        return bz2.open(input_qs_path, 'rb')
+    elif input_qs_path.endswith(('.qs.gz', '.qs.bgz')):
+        return gzip.open(input_qs_path, 'rb')
+    elif input_qs_path.endswith('.qs'):
+        return open(input_qs_path, 'rb')
+    else:
+        raise TypeError(f'Unsupported file suffix for {input_qs_path}, '
+                        f'must be `.qs`, `.qs.bz2`, `.qs.gz` or `.qs.bgz`.')
+
+
+def _print_parse_error(input_qs_path: str, row_number, qs_row,
+                       parse_err) -> None:
+    print(f'Error reconstructing pairs from row {row_number} in '
+          f'{input_qs_path}, {qs_row!r} ({str(parse_err)})', file=sys.stderr)
+
+
+def _qs_row_sort_key(qs_row: bytes) -> (int, bytes):
+    """Get a `(timestamp, identifier)` sort key from the prefix of *qs_row*.
+    """
+
+    prefix_components = qs_row.split(b',', 2)
+    if len(prefix_components) < 3:
+        raise AssertionError(f'Malformatted input row {qs_row!r}')
+
+    identifier, timestamp = prefix_components[:2]
+    try:
+        return int(timestamp), identifier
+    except ValueError:
+        raise ValueError(f'Timestamp {timestamp!r} not castable to int')
 
 
 def _validate_and_cast_timestamp_to_epoch_str(timestamp) -> str:
@@ -35,6 +96,39 @@ def _validate_and_cast_timestamp_to_epoch_str(timestamp) -> str:
     return str(int_timestamp)
 
 
+def _format_key_value_pairs(key_value_pairs: list) -> list:
+    """Format *key_value_pairs* as .qs components, one string per pair."""
+
+    components = []
+    for idx, pair in enumerate(key_value_pairs):
+        try:
+            key, value = pair
+        except ValueError as unpack_err:
+            raise ValueError(f'Error unpacking {pair!r} at index {idx} record '
+                             f'({str(unpack_err)}')
+
+        if isinstance(value, str):
+            components.append(f'{key}={value}')
+        elif value is None:
+            components.append(f'{key}=(null)')
+        elif isinstance(value, list):
+            subcomponents = []
+            for sub_key, sub_value in value:
+                if not isinstance(sub_value, list):
+                    subcomponents.append(f'{sub_key}={sub_value}')
+                else:
+                    level2_nested = ', '.join(
+                        [f'{k}: {v}' for k, v in sub_value])
+                    subcomponents.append(f'{sub_key}=[{level2_nested}]')
+            components.append('%s={%s}' % (key, ', '.join(subcomponents)))
+        elif isinstance(value, (dict, OrderedDict)):
+            components.append('%s=%s' % (key, codec.dumps(value)))
+        else:
+            raise TypeError(f'Unsupported data type in {pair!r}')
+
+    return components
+
+
 def _reconstruct_comma_values(input_components: list) -> list:
     inside_level2_list = False
     output_components = []
@@ -82,10 +176,44 @@ def _get_level2_list_pair(level2_key_value_str: str) -> (str, str):
     return key.lstrip(), value.lstrip()
 
 
-def _reconstruct_key_value_pairs(key_value_components: list) -> list:
+def _load_nested_dict(nested_dict_str: str, raw_json: bool = False):
+    if raw_json:
+        return RawJSON(nested_dict_str)
+
+    return codec.loads(nested_dict_str)
+
+
+def _find_segment_cache_key(key_value_components: list, start_idx: int,
+                            raw_json: bool):
+    """Get `(cache_key, end_idx)` of the nested segment starting at index
+    *start_idx*, assuming it ends with the first component ending with `}`.
+    """
+
+    for end_idx in range(start_idx, len(key_value_components)):
+        if key_value_components[end_idx].endswith('}'):
+            return _segment_cache_key(key_value_components, start_idx,
+                                      end_idx, raw_json), end_idx
+
+    return None, None
+
+
+def _segment_cache_key(key_value_components: list, start_idx: int,
+                       end_idx: int, raw_json: bool) -> tuple:
+    # The nesting key doesn't affect parsing, so leave it out. Components are
+    # kept apart, as squashed ones may hold commas themselves.
+    _, first_nested_pair = key_value_components[start_idx].split('={')
+
+    return (raw_json, first_nested_pair) + \
+        tuple(key_value_components[start_idx + 1:end_idx + 1])
+
+
+def _reconstruct_key_value_pairs(key_value_components: list,
+                                 raw_json: bool = False, cache=None) -> list:
 
     parsed_components = []
 
+    segment_start_idx, segment_start_len, skip_to_idx = None, 0, -1
+
     tmp_nesting_key = None
     tmp_nested_list_components, tmp_nested_dict_components = [], []
     parsing_nested_list, parsing_nested_dict = False, False
@@ -95,6 +223,27 @@ def _reconstruct_key_value_pairs(key_value_components: list) -> list:
     parsing_level2_list = False
 
     for idx, thing in enumerate(key_value_components):
+        if idx <= skip_to_idx:
+            continue
+
+        if cache is not None and thing.count('={') == 1 and \
+                not any([parsing_nested_list, parsing_nested_dict,
+                         parsing_level2_list, tmp_nested_list_components,
+                         tmp_nested_dict_components,
+                         tmp_level2_list_components]):
+            # Any complete segment once parsed from this clean state, with no
+            # flags or buffers left over from malformed earlier ones, parses
+            # the same again, so a cached one can be used as is.
+            cache_key, end_idx = _find_segment_cache_key(
+                key_value_components, idx, raw_json)
+            cached_value = cache.get(cache_key, None) \
+                if cache_key is not None else None
+            if cached_value is not None:
+                parsed_components.append((thing.split('={')[0], cached_value))
+                skip_to_idx = end_idx
+                continue
+            segment_start_idx, segment_start_len = idx, len(parsed_components)
+
         try:
             if thing.count('=') == 1 and '={' not in thing \
                     and not any([parsing_nested_list, parsing_nested_dict]):
@@ -169,8 +318,9 @@ def _reconstruct_key_value_pairs(key_value_components: list) -> list:
                     else:
                         # Pack it up and reset local state, single-pair case.
                         parsed_components.append(
-                            (tmp_nesting_key, ujson.loads(
-                                '{%s}' % first_nested_pair.rstrip('}')))
+                            (tmp_nesting_key, _load_nested_dict(
+                                '{%s}' % first_nested_pair.rstrip('}'),
+                                raw_json))
                         )
                         parsing_nested_dict = False
 
@@ -219,8 +369,9 @@ def _reconstruct_key_value_pairs(key_value_components: list) -> list:
                           match(r'\s*"\w+":.+', last_nested_pair)]):
                     # Close nested dict.
                     parsed_components.append(
-                        (tmp_nesting_key, ujson.loads('{%s}' % ','.join(
-                            tmp_nested_dict_components + [last_nested_pair])))
+                        (tmp_nesting_key, _load_nested_dict('{%s}' % ','.join(
+                            tmp_nested_dict_components + [last_nested_pair]),
+                            raw_json))
                     )
                     tmp_nested_dict_components = []
                     parsing_nested_dict = False
@@ -283,11 +434,31 @@ def _reconstruct_key_value_pairs(key_value_components: list) -> list:
                 tmp_nested_dict_components.append(intermediate_nested_pair)
 
             else:
-                raise AssertionError(f"L2c Don't know what to do with {thing!r}")
+                raise AssertionError(
+                    f"L2c Don't know what to do with {thing!r}")
 
         except Exception as parse_err:
             raise parse_err.__class__(f'L1 Error parsing {thing!r} at index '
                                       f'{idx} in {key_value_components!r} '
                                       f'({str(parse_err)}, FALLBACK)')
 
+        if segment_start_idx is not None and \
+                not any([parsing_nested_list, parsing_nested_dict]):
+            # Segment complete, cache it by all of its raw text. Unless it
+            # didn't come out as one pair keyed by its first component, e.g.
+            # when a later `={` restarted nesting under another key, or left
+            # buffers or flags behind, as it then wasn't parsed cleanly.
+            if len(parsed_components) == segment_start_len + 1 and \
+                    not any([parsing_level2_list, tmp_nested_list_components,
+                             tmp_nested_dict_components,
+                             tmp_level2_list_components]) and \
+                    not any('={' in component for component in
+                            key_value_components[segment_start_idx + 1:
+                                                 idx + 1]):
+                cache.put(_segment_cache_key(key_value_components,
+                                             segment_start_idx, idx,
+                                             raw_json),
+                          parsed_components[-1][1])
+            segment_start_idx = None
+
     return parsed_components
@@ -0,0 +1,338 @@
+"""Module providing the buffered `QsWriter` for incremental .qs output, and
+the `PartitionedWriter` splitting it into files by identifier and time.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from .bgzf import BlockGzipWriter
+from .util import (_validate_and_cast_timestamp_to_epoch_str,
+                   _format_key_value_pairs)
+
+
+class QsWriter:
+    """Buffered writer, serializing .qs rows straight into an output buffer.
+
+    Rows are accumulated in a reusable buffer and written to *fileobj_or_path*
+    in blocks of about *flush_every* characters. Paths ending with `.gz`,
+    `.bz2` or `.bgz` are compressed accordingly, unless *compression*
+    (`'gzip'`, `'bz2'`, `'bgzf'` or `None`) says otherwise. Files opened by
+    the writer are closed along with it, file objects passed in are only
+    flushed.
+
+    With `'bgzf'` compression rows go into independent gzip members of at
+    most *block_size* bytes uncompressed, see `qsck.bgzf`.
+    """
+
+    def __init__(self, fileobj_or_path, compression: str = 'infer',
+                 flush_every: int = 1024 * 1024,
+                 block_size: int = 1024 * 1024):
+        if compression == 'infer':
+            compression = None
+            if isinstance(fileobj_or_path, str):
+                if fileobj_or_path.endswith('.gz'):
+                    compression = 'gzip'
+                elif fileobj_or_path.endswith('.bz2'):
+                    compression = 'bz2'
+                elif fileobj_or_path.endswith('.bgz'):
+                    compression = 'bgzf'
+
+        if compression not in (None, 'gzip', 'bz2', 'bgzf'):
+            raise ValueError(f'Unsupported compression {compression!r}, must '
+                             f'be `gzip`, `bz2`, `bgzf` or None')
+
+        self._block_writer = None
+        self._owned_files = []
+        if compression == 'bgzf':
+            self._block_writer = BlockGzipWriter(fileobj_or_path, block_size)
+            fileobj = None
+        elif isinstance(fileobj_or_path, str):
+            fileobj = open(fileobj_or_path, 'wb')
+            self._owned_files.append(fileobj)
+        else:
+            fileobj = fileobj_or_path
+
+        if compression == 'gzip':
+            fileobj = gzip.GzipFile(fileobj=fileobj, mode='wb')
+            self._owned_files.insert(0, fileobj)
+        elif compression == 'bz2':
+            fileobj = bz2.BZ2File(fileobj, mode='wb')
+            self._owned_files.insert(0, fileobj)
+
+        self._fileobj = fileobj
+        self._text_mode = isinstance(fileobj, io.TextIOBase)
+        self._flush_every = flush_every
+        self._buffer = []
+        self._buffered_chars = 0
+        self.rows_written = 0
+        self.closed = False
+
+    def write(self, identifier: str, timestamp, key_value_pairs: []) -> None:
+        """Serialize a single .qs row into the output buffer."""
+
+        if self.closed:
+            raise ValueError('Write to closed QsWriter')
+
+        components = [identifier,
+                      _validate_and_cast_timestamp_to_epoch_str(timestamp)]
+        components.extend(_format_key_value_pairs(key_value_pairs))
+        qs_row = ','.join(components) + '\n'
+
+        if self._block_writer is not None:
+            self._block_writer.write_row(qs_row.encode('utf-8'),
+                                         int(components[1]))
+            self.rows_written += 1
+            return
+
+        self._buffer.append(qs_row)
+        self._buffered_chars += len(qs_row)
+        self.rows_written += 1
+
+        if self._buffered_chars >= self._flush_every:
+            self._write_block()
+
+    def write_many(self, records) -> None:
+        """Serialize identifier-timestamp-key_value_pairs 3-tuple *records*."""
+
+        for identifier, timestamp, key_value_pairs in records:
+            self.write(identifier, timestamp, key_value_pairs)
+
+    def _write_block(self) -> None:
+        if self._buffer:
+            block = ''.join(self._buffer)
+            self._buffer.clear()
+            self._buffered_chars = 0
+            self._fileobj.write(block if self._text_mode
+                                else block.encode('utf-8'))
+
+    def flush(self) -> None:
+        """Write out buffered rows in one block, flush the output file."""
+
+        if self._block_writer is not None:
+            self._block_writer.flush()
+            return
+
+        self._write_block()
+        self._fileobj.flush()
+
+    def close(self) -> None:
+        """Flush buffered rows, close any files opened by the writer."""
+
+        if self.closed:
+            return
+
+        if self._block_writer is not None:
+            self._block_writer.close()
+        else:
+            self._write_block()
+            if not self._owned_files:
+                self._fileobj.flush()
+            for owned_file in self._owned_files:
+                owned_file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+PARTITION_FIELDS = ('identifier', 'hour', 'day')
+
+_PARTIAL_SUFFIX = '.partial'
+
+
+class PartitionedWriter:
+    """Writes rows into one file per partition under *output_dir*.
+
+    Partitions are keyed on *partition_by* fields of each row's prefix,
+    `identifier`, UTC `hour` and/or UTC `day` of its timestamp, and laid out
+    Hive-style, e.g. `identifier=LOG/hour=2019-01-07T22.qs`. Rows are
+    buffered per partition, and written in blocks of about *flush_every*
+    characters. At most *max_open_files* files are kept open at a time, least
+    recently used ones are closed and reopened for appending when needed;
+    compressed files then get another gzip member or bzip2 stream.
+
+    Files are compressed by *suffix* (`.gz` or `.bz2`) unless *compression*
+    (`'gzip'`, `'bz2'` or `None`) says otherwise. They're written with a
+    `.partial` suffix, and renamed into place only once the writer is closed
+    without errors.
+    """
+
+    def __init__(self, output_dir: str,
+                 partition_by: [str] = ('identifier', 'hour'),
+                 suffix: str = '.qs', compression: str = 'infer',
+                 max_open_files: int = 128, flush_every: int = 64 * 1024):
+        for field in partition_by:
+            if field not in PARTITION_FIELDS:
+                raise ValueError(f'Unsupported partition field {field!r}, '
+                                 f'must be one of {PARTITION_FIELDS}')
+
+        if compression == 'infer':
+            compression = None
+            if suffix.endswith('.gz'):
+                compression = 'gzip'
+            elif suffix.endswith('.bz2'):
+                compression = 'bz2'
+
+        if compression not in (None, 'gzip', 'bz2'):
+            raise ValueError(f'Unsupported compression {compression!r}, must '
+                             f'be `gzip`, `bz2` or None')
+
+        self.output_dir = output_dir
+        self.partition_by = tuple(partition_by)
+        self.suffix = suffix
+        self.compression = compression
+        self.max_open_files = max_open_files
+        self._flush_every = flush_every
+
+        self._partition_paths = {}
+        self._buffers = {}
+        self._buffered_chars = {}
+        self._open_files = OrderedDict()
+        self._started_paths = set()
+        self.rows_written = 0
+        self.closed = False
+
+    def _partition_path(self, identifier: str, timestamp: str) -> str:
+        try:
+            hour = int(timestamp) // 3600
+        except ValueError:
+            raise ValueError(f'Timestamp {timestamp!r} to partition by is not '
+                             f'an epoch timestamp') from None
+        partition_key = (identifier, hour)
+        try:
+            return self._partition_paths[partition_key]
+        except KeyError:
+            pass
+
+        path_components = []
+        for field in self.partition_by:
+            if field == 'identifier':
+                value = quote(identifier, safe='')
+            elif field == 'hour':
+                value = time.strftime('%Y-%m-%dT%H', time.gmtime(hour * 3600))
+            else:
+                value = time.strftime('%Y-%m-%d', time.gmtime(hour * 3600))
+            path_components.append(f'{field}={value}')
+        partition_path = os.path.join(self.output_dir, *path_components) + \
+            self.suffix
+
+        self._partition_paths[partition_key] = partition_path
+        return partition_path
+
+    def write(self, identifier: str, timestamp, key_value_pairs: []) -> None:
+        """Serialize a single .qs row into its partition's buffer."""
+
+        timestamp = _validate_and_cast_timestamp_to_epoch_str(timestamp)
+        components = [identifier, timestamp]
+        components.extend(_format_key_value_pairs(key_value_pairs))
+        self.write_line(identifier, timestamp, ','.join(components))
+
+    def write_many(self, records) -> None:
+        """Serialize identifier-timestamp-key_value_pairs 3-tuple *records*."""
+
+        for identifier, timestamp, key_value_pairs in records:
+            self.write(identifier, timestamp, key_value_pairs)
+
+    def write_line(self, identifier: str, timestamp, line: str) -> None:
+        """Buffer an already formatted *line*, e.g. JSON, by its row prefix.
+        """
+
+        if self.closed:
+            raise ValueError('Write to closed PartitionedWriter')
+
+        partition_path = self._partition_path(identifier, timestamp)
+        buffer = self._buffers.get(partition_path)
+        if buffer is None:
+            buffer = self._buffers[partition_path] = []
+            self._buffered_chars[partition_path] = 0
+
+        buffer.append(line + '\n')
+        self._buffered_chars[partition_path] += len(line) + 1
+        self.rows_written += 1
+
+        if self._buffered_chars[partition_path] >= self._flush_every:
+            self._write_block(partition_path)
+
+    def _open_file(self, partition_path: str):
+        partition_file = self._open_files.get(partition_path)
+        if partition_file is not None:
+            self._open_files.move_to_end(partition_path)
+            return partition_file
+
+        if len(self._open_files) >= self.max_open_files:
+            self._open_files.popitem(last=False)[1].close()
+
+        partial_path = partition_path + _PARTIAL_SUFFIX
+        if partition_path in self._started_paths:
+            mode = 'ab'
+        else:
+            mode = 'wb'  # Truncating leftovers of earlier, failed runs.
+            os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+            self._started_paths.add(partition_path)
+
+        if self.compression == 'gzip':
+            partition_file = gzip.open(partial_path, mode)
+        elif self.compression == 'bz2':
+            partition_file = bz2.open(partial_path, mode)
+        else:
+            partition_file = open(partial_path, mode)
+
+        self._open_files[partition_path] = partition_file
+        return partition_file
+
+    def _write_block(self, partition_path: str) -> None:
+        buffer = self._buffers[partition_path]
+        if buffer:
+            self._open_file(partition_path).write(
+                ''.join(buffer).encode('utf-8'))
+            buffer.clear()
+            self._buffered_chars[partition_path] = 0
+
+    def flush(self) -> None:
+        """Write out all buffered rows, flush open partition files."""
+
+        for partition_path in self._buffers:
+            self._write_block(partition_path)
+        for partition_file in self._open_files.values():
+            partition_file.flush()
+
+    @property
+    def partition_paths(self) -> [str]:
+        """Paths of all partitions written to, sorted."""
+
+        return sorted(self._buffers)
+
+    def close(self, finalize: bool = True) -> None:
+        """Write out buffered rows, close all files and, if *finalize*, rename
+        them into place. Otherwise, they're left with their `.partial` suffix.
+        """
+
+        if self.closed:
+            return
+
+        try:
+            if finalize:
+                for partition_path in self._buffers:
+                    self._write_block(partition_path)
+        finally:
+            while self._open_files:
+                self._open_files.popitem()[1].close()
+            self.closed = True
+
+        if finalize:
+            for partition_path in self._started_paths:
+                os.replace(partition_path + _PARTIAL_SUFFIX, partition_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close(finalize=exc_type is None)
@@ -25,7 +25,13 @@ setup(
     entry_points={
         'console_scripts': [
             'qs-parse = qsck.parse_cli:qs_parse',
-            'qs-format = qsck.format_cli:qs_format'
+            'qs-parse-client = qsck.client:main',
+            'qs-format = qsck.format_cli:qs_format',
+            'qs-merge = qsck.merge_cli:qs_merge',
+            'qs-load = qsck.load_cli:qs_load',
+            'qs-index = qsck.grep_cli:qs_index',
+            'qs-grep = qsck.grep_cli:qs_grep',
+            'qs-fuzz = qsck.fuzz_cli:qs_fuzz'
         ]
     },
     setup_requires=[
@@ -33,7 +39,7 @@ setup(
     ],
     install_requires=[
         'Click',
-        'ujson'
+        'ujson>=2'
     ],
     tests_require=[
         'pytest'
@@ -46,9 +52,8 @@ setup(
         'License :: OSI Approved',
         'Natural Language :: English',
         'Operating System :: POSIX',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Topic :: Software Development :: Quality Assurance'
     ],
-    python_requires='>=3.6'
+    python_requires='>=3.7'
 )
@@ -0,0 +1,106 @@
+import gzip
+import os
+
+import ujson
+from click.testing import CliRunner
+
+from qsck import QsWriter, serialize
+from qsck.bgzf import read_block_table, read_block
+from qsck.format_cli import qs_format
+from qsck.parse_cli import qs_parse
+
+RECORDS = [('LOG', 1546902289 + i, [('n', str(i)), ('pad', 'x' * 40)])
+           for i in range(100)]
+
+
+def test_it_writes_gzip_members_of_whole_rows_with_a_block_table(tmp_path):
+    qs_path = str(tmp_path / 'records.qs.bgz')
+
+    with QsWriter(qs_path, block_size=1000) as qs_writer:
+        qs_writer.write_many(RECORDS)
+
+    expected_rows = [serialize(*record).encode() for record in RECORDS]
+    with gzip.open(qs_path, 'rb') as qs_file:
+        assert qs_file.read() == b''.join(expected_rows)
+
+    blocks = read_block_table(qs_path)
+    assert len(blocks) > 1
+    assert sum(block['lines'] for block in blocks) == 100
+
+    for block in blocks:
+        block_rows = read_block(qs_path, block)
+        first_idx = block['first_line'] - 1
+        assert len(b''.join(block_rows)) <= 1000
+        assert block_rows == expected_rows[first_idx:first_idx + len(
+            block_rows)]
+        assert block['min_timestamp'] == 1546902289 + first_idx
+        assert block['max_timestamp'] == 1546902289 + first_idx + \
+            block['lines'] - 1
+
+
+def test_qs_format_and_qs_parse_round_trip_block_compressed_files(tmp_path):
+    json_path = tmp_path / 'records.json'
+    json_path.write_text(''.join(ujson.dumps(record) + '\n'
+                                 for record in RECORDS))
+    qs_path = str(tmp_path / 'records.qs.bgz')
+
+    result = CliRunner().invoke(qs_format, [str(json_path), '--output',
+                                            qs_path, '--block-size', '1'])
+    assert result.exit_code == 0
+    assert len(read_block_table(qs_path)) > 1
+
+    for jobs in ('1', '2'):
+        result = CliRunner().invoke(qs_parse, [qs_path, '--jobs', jobs,
+                                               '--since', '1546902300',
+                                               '--until', '1546902309'])
+        assert result.exit_code == 0
+        assert [ujson.loads(line)[2][0] for line in
+                result.output.splitlines()] == [['n', str(i)]
+                                                for i in range(11, 21)]
+
+
+def test_it_ignores_out_of_date_block_tables(tmp_path):
+    qs_path = str(tmp_path / 'records.qs.bgz')
+    with QsWriter(qs_path, block_size=1000) as qs_writer:
+        qs_writer.write_many(RECORDS)
+    with open(qs_path, 'ab') as qs_file:
+        qs_file.write(gzip.compress(serialize(
+            'LOG', 1546902389, [('n', 'appended')]).encode()))
+
+    assert read_block_table(qs_path) is None
+
+    result = CliRunner().invoke(qs_parse, [qs_path, '--since', '1546902389'])
+    assert result.exit_code == 0
+    assert [ujson.loads(line)[2] for line in result.stdout.splitlines()] == \
+        [[['n', 'appended']]]
+    assert 'Ignoring out-of-date block table' in result.stderr
+
+
+def test_it_ignores_block_tables_of_touched_files(tmp_path):
+    qs_path = str(tmp_path / 'records.qs.bgz')
+    with QsWriter(qs_path, block_size=1000) as qs_writer:
+        qs_writer.write_many(RECORDS)
+    source_stat = os.stat(qs_path)
+
+    os.utime(qs_path, ns=(source_stat.st_atime_ns,
+                          source_stat.st_mtime_ns + 1))
+
+    assert read_block_table(qs_path) is None
+
+
+def test_it_splits_blocks_on_newlines_only(tmp_path):
+    qs_path = str(tmp_path / 'records.qs.bgz')
+    records = [('LOG', 1546902289, [('a', 'x\ry')]),
+               ('LOG', 1546902290, [('a', 'z')])]
+    with QsWriter(qs_path) as qs_writer:
+        qs_writer.write_many(records)
+
+    [block] = read_block_table(qs_path)
+    assert read_block(qs_path, block) == [
+        serialize(*record).encode() for record in records]
+
+    result = CliRunner().invoke(qs_parse, [qs_path, '--jobs', '2'])
+    assert result.exit_code == 0
+    assert result.stderr == ''
+    assert [ujson.loads(line)[2] for line in result.stdout.splitlines()] == \
+        [[['a', 'x\ry']], [['a', 'z']]]
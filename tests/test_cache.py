@@ -0,0 +1,75 @@
+from qsck import deserialize, SegmentCache
+
+QS_ROWS = [
+    'LOG,1554930014,_model=SM-N960U,event_vars={subtype=disconnected},'
+    'event1_vars={},event6_vars={isDocked=true, networkInfo=[type: '
+    'MOBILE[LTE], roaming: false], extraInfo=},'
+    'info_runDat4={"app_install_time":1545251927594,"n":0.5},'
+    'single={only=one},time=1546902289176',
+    'LOG,1554930015,other_vars={subtype=disconnected},event1_vars={},'
+    'info_runDat4={"app_install_time":1545251927594,"n":0.5},'
+    'level2={networkInfo=[type: MOBILE[LTE]]},x=1',
+]
+
+
+def test_it_returns_the_same_results_as_without_cache():
+    cache = SegmentCache(maxsize=100)
+
+    for _ in range(3):
+        for qs_row in QS_ROWS:
+            assert deserialize(qs_row, cache=cache) == deserialize(qs_row)
+            assert deserialize(qs_row, raw_json=True, cache=cache) == \
+                deserialize(qs_row, raw_json=True)
+
+    assert cache.hits > 0
+    assert 0 < cache.hit_rate < 1
+    assert cache.stats()['size'] == len(cache)
+
+
+def test_it_returns_copies_callers_cant_corrupt_the_cache_with():
+    cache = SegmentCache()
+    qs_row = QS_ROWS[0]
+
+    _, __, key_value_pairs = deserialize(qs_row, cache=cache)
+    key_value_pairs[1][1].append(('corrupted', 'yes'))
+    key_value_pairs[4][1]['n'] = 'corrupted'
+
+    _, __, key_value_pairs = deserialize(qs_row, cache=cache)
+    assert key_value_pairs == deserialize(qs_row)[2]
+    key_value_pairs[3][1][1][1].append(('corrupted', 'again'))
+
+    assert deserialize(qs_row, cache=cache) == deserialize(qs_row)
+
+
+def test_it_evicts_least_recently_used_segments():
+    cache = SegmentCache(maxsize=2)
+
+    cache.put('a', [('k', 'a')])
+    cache.put('b', [('k', 'b')])
+    assert cache.get('a') == [('k', 'a')]
+    cache.put('c', [('k', 'c')])
+
+    assert cache.get('b', None) is None
+    assert cache.get('a') == [('k', 'a')]
+    assert cache.get('c') == [('k', 'c')]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_it_doesnt_cache_segments_restarting_nesting_under_another_key():
+    cache = SegmentCache()
+
+    for qs_row in ('LOG,1554930014,e={y=a, x={2=},z=1',
+                   'LOG,1554930014,k={"a":null,"b={"c":null}'):
+        for _ in range(2):
+            assert deserialize(qs_row, cache=cache) == deserialize(qs_row)
+
+
+def test_it_doesnt_cache_segments_parsed_with_leftover_state():
+    cache = SegmentCache()
+    dirty_qs_row = 'LOG,1546902289,a={k=v, n=[p: 1, x=1},b={m=[r: 2, s: 3]}'
+    clean_qs_row = 'LOG,1546902290,b={m=[r: 2, s: 3]}'
+
+    assert deserialize(dirty_qs_row, cache=cache) == deserialize(dirty_qs_row)
+    assert deserialize(clean_qs_row, cache=cache) == \
+        deserialize(clean_qs_row) == \
+        ('LOG', '1546902290', [('b', [('m', [('r', '2'), ('s', '3')])])])
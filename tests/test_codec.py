@@ -0,0 +1,143 @@
+import os
+import random
+import struct
+import subprocess
+import sys
+from collections import OrderedDict
+
+import pytest
+import ujson
+from click.testing import CliRunner
+
+from qsck import codec, deserialize, serialize
+from qsck.load_cli import qs_load
+from qsck.parse_cli import qs_parse
+
+CODECS = codec.available_codecs()
+
+VALUES = [
+    {'app_install_time': 1545251927594, 'path': 'a/b', 'n': None},
+    OrderedDict([('k31', 2.0), ('k32', [True, False, -0.0])]),
+    {'floats': [1e+20, 1e16, 1e15, 1.5e-7, 1e-5, 2.5e-5, 1e-4, 0.1, 5e-324,
+                1.7976931348623157e+308, 123456789.12345679, 10.00001]},
+    {'ints': [2 ** 63, 2 ** 64, -12345678901234567890123, 0]},
+    {'ints': [2 ** 63 - 1, 2 ** 64 - 1, -2 ** 64]},
+    {'n': -9254517573091273273}, {'n': -2 ** 63}, {'n': -2 ** 63 - 1},
+    {'text': 'é/ü😀 \x00\x08\x0c\x1f\x7f"\\\t\n', 'escaped': '\\u007f'},
+    {1: 'int key', 'nested': {'deeper': [{'a': '1.2300e+5 0.00001'}]}},
+    ('LOG', '1546902289', [('info', {'x': 1.25e-6})]),
+]
+
+
+def _random_float(rng: random.Random) -> float:
+    while True:
+        value = struct.unpack('<d', rng.getrandbits(64).to_bytes(8, 'little'))
+        if value[0] == value[0] and abs(value[0]) != float('inf'):
+            return value[0]
+
+
+@pytest.fixture(autouse=True)
+def reset_codec():
+    yield
+    codec.set_codec('auto')
+
+
+@pytest.mark.parametrize('codec_name', CODECS)
+def test_it_outputs_the_same_json_as_ujson(codec_name):
+    json_codec = codec.get_codec(codec_name)
+
+    for value in VALUES:
+        assert json_codec.dumps(value) == ujson.dumps(value)
+        assert json_codec.loads(ujson.dumps(value)) == \
+            ujson.loads(ujson.dumps(value))
+
+
+@pytest.mark.parametrize('codec_name', CODECS)
+def test_it_formats_floats_the_same_as_ujson(codec_name):
+    json_codec = codec.get_codec(codec_name)
+    rng = random.Random(38)
+    floats = [_random_float(rng) for _ in range(2000)] + \
+        [rng.uniform(-10, 10) * 10 ** rng.randint(-8, 20) for _ in range(2000)]
+
+    assert json_codec.dumps(floats) == ujson.dumps(floats)
+    assert json_codec.loads(json_codec.dumps(floats)) == floats
+
+
+@pytest.mark.parametrize('codec_name', CODECS)
+def test_it_round_trips_rows_the_same_with_any_codec(codec_name):
+    qs_row = serialize('LOG', '1546902289', [
+        ('info_runDat4', {'app_install_time': 1545251927594, 'n': 1e-5,
+                          'url': 'http://x/y'}),
+        ('user', 'jenkins')])
+
+    codec.set_codec(codec_name)
+
+    assert serialize(*deserialize(qs_row)) == qs_row
+
+
+def test_it_rejects_unknown_codecs():
+    with pytest.raises(ValueError):
+        codec.get_codec('simplejson')
+
+
+def test_it_outputs_the_same_with_any_json_codec(tmp_path, monkeypatch):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(serialize('LOG', '1546902289', [
+        ('info', {'t': 1545251927594, 'f': 1.5e-7, 'u': 'é/x'})]))
+    monkeypatch.setenv(codec.CODEC_ENV_VAR, 'auto')
+
+    outputs = {CliRunner().invoke(qs_parse, ['--json-codec', codec_name,
+                                             str(qs_path)]).stdout
+               for codec_name in CODECS}
+
+    assert len(outputs) == 1
+
+
+@pytest.mark.parametrize('codec_name', CODECS)
+@pytest.mark.parametrize('value', (float('inf'), float('-inf'), float('nan')))
+def test_it_raises_on_non_finite_floats_with_any_codec(codec_name, value):
+    json_codec = codec.get_codec(codec_name)
+
+    with pytest.raises(OverflowError):
+        json_codec.dumps({'n': None, 'x': [1.5, value]})
+
+
+def test_it_falls_back_to_auto_on_an_invalid_codec_variable():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import qsck.codec as c; '
+                               'print(c.active_codec.name)'],
+        env=dict(os.environ, **{codec.CODEC_ENV_VAR: 'simplejson'}),
+        capture_output=True, text=True)
+
+    assert result.returncode == 0
+    assert result.stdout.strip() == codec.available_codecs()[0]
+    assert "Unknown JSON codec 'simplejson'" in result.stderr
+
+
+def test_schemas_and_sqlite_json_columns_go_through_the_codec(tmp_path,
+                                                              monkeypatch):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('LOG,1546902289,battery=87,event_vars={subtype=x}\n')
+    schema_path = tmp_path / 'schema.json'
+    schema_path.write_text('{"battery": "int"}')
+    codec_calls = []
+
+    def _spy(name, codec_func):
+        def spy(obj):
+            codec_calls.append((name, obj))
+            return codec_func(obj)
+
+        return spy
+
+    monkeypatch.setattr(codec, 'loads', _spy('loads', codec.loads))
+    monkeypatch.setattr(codec, 'dumps', _spy('dumps', codec.dumps))
+
+    result = CliRunner().invoke(qs_parse, ['--schema', str(schema_path),
+                                           str(qs_path)])
+    assert result.exit_code == 0
+    assert ('loads', '{"battery": "int"}') in codec_calls
+
+    result = CliRunner().invoke(qs_load, ['sqlite', str(tmp_path / 'q.db'),
+                                          str(qs_path)])
+    assert result.exit_code == 0
+    assert ('dumps', [('subtype', 'x')]) in codec_calls
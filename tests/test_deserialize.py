@@ -1,6 +1,6 @@
 from pytest import raises
 
-from qsck import deserialize
+from qsck import deserialize, iter_deserialize, RawJSON
 
 
 def test_deserialize_is_a_function():
@@ -225,3 +225,46 @@ def test_it_parses_event_data_fields_with_funky_chars_in():
          'Travis Scott Featuring Drake, Juicy J And Swae Lee'),
         ('event34_time', '1554927722941')
     ]
+
+
+def test_it_passes_nested_dict_content_through_as_raw_json():
+    qs_row = (
+        'LOG,1546902289,user=jenkins,'
+        '1nfo_healthDat4={"battery_max":0.89,"battery_min":0.78},'
+        'info_runDat4={"app_install_time":1545251927594},'
+        'time=1546902289176'
+    )
+
+    _, __, key_value_pairs = deserialize(qs_row, raw_json=True)
+
+    assert key_value_pairs == [
+        ('user', 'jenkins'),
+        ('1nfo_healthDat4', '{"battery_max":0.89,"battery_min":0.78}'),
+        ('info_runDat4', '{"app_install_time":1545251927594}'),
+        ('time', '1546902289176')
+    ]
+    assert isinstance(key_value_pairs[1][1], RawJSON)
+    assert isinstance(key_value_pairs[2][1], RawJSON)
+    assert not isinstance(key_value_pairs[0][1], RawJSON)
+
+
+def test_iter_deserialize_streams_rows_and_reports_errors():
+    qs_rows = [b'LOG,1546902289,_model=LG-M327\n',
+               b'\n',
+               'LOG,1546902290\n',
+               'LOG,1546902291,_app_version=(null)\n']
+    errors = []
+
+    records = iter_deserialize(qs_rows,
+                               on_error=lambda *err: errors.append(err))
+
+    assert list(records) == [
+        ('LOG', '1546902289', [('_model', 'LG-M327')]),
+        ('LOG', '1546902291', [('_app_version', None)])
+    ]
+    assert [(idx, qs_row) for idx, qs_row, _ in errors] == [
+        (3, 'LOG,1546902290\n')]
+    assert isinstance(errors[0][2], AssertionError)
+
+    with raises(AssertionError):
+        list(iter_deserialize(qs_rows))
@@ -0,0 +1,85 @@
+from click.testing import CliRunner
+
+from qsck import deserialize
+from qsck.fuzz import (available_engines, check_qs_row, fuzz,
+                       generate_qs_rows, mutate_qs_rows, reduce_qs_row)
+from qsck.fuzz_cli import qs_fuzz
+
+QS_ROWS = [
+    'LOG,1554930014,_model=SM-N960U,event_vars={subtype=disconnected},'
+    'event1_vars={},event6_vars={isDocked=true, networkInfo=[type: '
+    'MOBILE[LTE], roaming: false], extraInfo=},'
+    'info_runDat4={"app_install_time":1545251927594,"n":0.5},'
+    'single={only=one},time=1546902289176',
+    'LOG,1554930015,other_vars={subtype=disconnected},x=a,b,c,'
+    'level2={networkInfo=[type: MOBILE[LTE]]},y=(null)',
+]
+
+
+def _drops_nulls(qs_row: str):
+    identifier, timestamp, key_value_pairs = deserialize(qs_row)
+    return identifier, timestamp, [(key, value)
+                                   for key, value in key_value_pairs
+                                   if value is not None]
+
+
+def test_it_finds_no_mismatches_between_engines():
+    qs_rows = list(generate_qs_rows(300, seed=1))
+
+    assert list(fuzz(qs_rows + QS_ROWS)) == []
+    assert list(fuzz(mutate_qs_rows(qs_rows + QS_ROWS, 300, seed=2))) == []
+
+
+def test_it_shares_one_cache_across_rows():
+    engines = available_engines()
+    shared_cache_engine = engines['shared_cache']
+
+    for qs_row in QS_ROWS * 2:
+        assert shared_cache_engine(qs_row) == deserialize(qs_row)
+    assert shared_cache_engine.cache.hits > 0
+    assert available_engines()['shared_cache'].cache.hits == 0
+
+
+def test_it_generates_rows_at_the_edges_of_parsers_and_codecs():
+    qs_rows = list(generate_qs_rows(300, seed=1))
+
+    assert any('922337203685477' in qs_row or '1844674407370955' in qs_row
+               for qs_row in qs_rows)
+    assert any(qs_row.endswith(next_qs_row.split(',', 2)[2]) and
+               '=[p: ' in qs_row
+               for qs_row, next_qs_row in zip(qs_rows, qs_rows[1:]))
+
+
+def test_it_generates_and_mutates_rows_reproducibly():
+    assert list(generate_qs_rows(20, seed=3)) == \
+        list(generate_qs_rows(20, seed=3))
+    assert list(mutate_qs_rows(QS_ROWS, 20, seed=3)) == \
+        list(mutate_qs_rows(QS_ROWS, 20, seed=3))
+    assert all(qs_row.startswith('LOG,155493001')
+               for qs_row in mutate_qs_rows(QS_ROWS, 20, seed=3))
+
+
+def test_it_reduces_mismatches_to_minimal_rows():
+    engines = dict(available_engines(), drops_nulls=_drops_nulls)
+
+    assert check_qs_row(QS_ROWS[0], engines) == {}
+    outcomes = check_qs_row(QS_ROWS[1], engines)
+    assert list(outcomes) == ['drops_nulls', 'reference']
+
+    [mismatch] = fuzz(QS_ROWS, engines)
+    assert mismatch.qs_row == QS_ROWS[1]
+    assert mismatch.minimal_qs_row == reduce_qs_row(
+        QS_ROWS[1], {'drops_nulls': _drops_nulls})
+    assert len(mismatch.minimal_qs_row) < 20
+    assert '(null)' in mismatch.minimal_qs_row
+
+
+def test_it_fuzzes_corpus_files(tmp_path):
+    qs_path = tmp_path / 'corpus.qs'
+    qs_path.write_text('\n'.join(QS_ROWS) + '\n')
+
+    result = CliRunner().invoke(qs_fuzz, ['--rows', '100', '--mutations',
+                                          '100', str(qs_path)])
+
+    assert result.exit_code == 0
+    assert 'No mismatches' in result.stderr
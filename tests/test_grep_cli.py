@@ -0,0 +1,114 @@
+import os
+
+from click.testing import CliRunner
+
+import qsck.grep_cli
+from qsck.bgzf import BlockGzipWriter, read_block_table
+from qsck.grep_cli import qs_grep, qs_index
+from qsck.index import BloomFilter, load_index, block_may_match
+
+
+def _write_qs_file(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(''.join(
+        f'LOG,{1546902289 + i},_model={"LG-M327" if i == 42 else "SM-N960U"},'
+        f'time={1546902289176 + i},'
+        f'event_vars={{subtype=connected}}'
+        f'{",event11_vars={batteryPct=0.78}" if i == 77 else ""}\n'
+        for i in range(100)))
+
+    return str(qs_path)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.for_capacity(100)
+    for i in range(100):
+        bloom.add(f'key{i}')
+
+    assert all(f'key{i}' in bloom for i in range(100))
+    assert sum(f'other{i}' in bloom for i in range(1000)) < 50
+
+    reloaded = BloomFilter.from_dict(bloom.to_dict())
+    assert all(f'key{i}' in reloaded for i in range(100))
+
+
+def test_it_indexes_blocks_and_skips_the_ones_that_cant_match(tmp_path):
+    qs_path = _write_qs_file(tmp_path)
+
+    result = CliRunner().invoke(
+        qs_index, ['--block-lines', '10', '--max-cardinality', '5', qs_path])
+    assert result.exit_code == 0
+
+    index = load_index(qs_path)
+    assert len(index['blocks']) == 10
+    assert index['value_keys'] == {'_model'}
+
+    assert [block_may_match(index, block, [('_model', 'LG-M327')])
+            for block in index['blocks']].count(True) <= 2
+    assert block_may_match(index, index['blocks'][4], [('_model', 'LG-M327')])
+    assert block_may_match(index, index['blocks'][7], [('event11_vars', None)])
+
+
+def test_it_greps_rows_by_key_value_and_key(tmp_path):
+    qs_path = _write_qs_file(tmp_path)
+    CliRunner().invoke(qs_index, ['--block-lines', '10', qs_path])
+
+    for args in ([], ['--no-index']):
+        result = CliRunner().invoke(qs_grep,
+                                    ['_model=LG-M327', qs_path, *args])
+        assert result.exit_code == 0
+        assert result.stdout_bytes == (
+            b'LOG,1546902331,_model=LG-M327,time=1546902289218,'
+            b'event_vars={subtype=connected}\n')
+
+        result = CliRunner().invoke(
+            qs_grep, ['event11_vars', qs_path, '--and', '_model=SM-N960U',
+                      *args])
+        assert result.exit_code == 0
+        assert result.stdout_bytes.startswith(b'LOG,1546902366,')
+        assert result.stdout_bytes.count(b'\n') == 1
+
+
+def test_it_ignores_out_of_date_indexes(tmp_path):
+    qs_path = _write_qs_file(tmp_path)
+    CliRunner().invoke(qs_index, [qs_path])
+
+    with open(qs_path, 'a') as qs_file:
+        qs_file.write('LOG,1546902999,_model=LG-M327\n')
+    os.utime(qs_path, ns=(0, 0))
+
+    assert load_index(qs_path) is None
+
+    result = CliRunner().invoke(qs_grep, ['_model=LG-M327', qs_path])
+    assert result.stdout_bytes.count(b'\n') == 2
+
+
+def test_it_only_decompresses_candidate_blocks_of_bgz_files(tmp_path,
+                                                            monkeypatch):
+    with open(_write_qs_file(tmp_path), 'rb') as qs_file:
+        qs_rows = qs_file.readlines()
+    qs_path = str(tmp_path / 'records.qs.bgz')
+    block_writer = BlockGzipWriter(qs_path, block_size=700)
+    for qs_row in qs_rows:
+        block_writer.write_row(qs_row, int(qs_row.split(b',')[1]))
+    block_writer.close()
+    CliRunner().invoke(qs_index, ['--block-lines', '10', qs_path])
+
+    read_offsets = []
+
+    def _read_block(input_qs_path, block):
+        read_offsets.append(block['offset'])
+        return read_block(input_qs_path, block)
+
+    read_block = qsck.grep_cli.read_block
+    monkeypatch.setattr(qsck.grep_cli, 'read_block', _read_block)
+
+    result = CliRunner().invoke(qs_grep, ['time', qs_path])
+    assert result.stdout_bytes == b''.join(qs_rows)
+    assert len(read_offsets) == len(set(read_offsets)) == \
+        len(read_block_table(qs_path))
+
+    read_offsets.clear()
+    result = CliRunner().invoke(qs_grep, ['_model=LG-M327', qs_path])
+    assert result.stdout_bytes == qs_rows[42]
+    assert len(read_offsets) <= 4
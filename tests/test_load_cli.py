@@ -0,0 +1,109 @@
+import sqlite3
+
+from click.testing import CliRunner
+
+from qsck.load_cli import qs_load
+
+QS_ROWS = (
+    'LOG,1546902289,_model=LG-M327,batteryPct=0.79,event11_time=1546901849405,'
+    'event_vars={subtype=disconnected},'
+    'info_runDat4={"app_install_time":1545251927594}\n'
+    'LOG,1546902290,_model=SM-N960U,batteryPct=(null),event11_time=1\n'
+    'LOG,1546902291\n'
+    'LOG,1546902292,_model=moto z3,late_key=surprise\n'
+)
+
+
+def _load(tmp_path, *args):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS)
+    db_path = str(tmp_path / 'records.db')
+
+    result = CliRunner().invoke(
+        qs_load, ['sqlite', db_path, str(qs_path), '--sample-size', '2',
+                  '--batch-size', '2', *args])
+
+    return result, sqlite3.connect(db_path)
+
+
+def test_it_loads_top_level_keys_into_typed_columns(tmp_path):
+    result, connection = _load(tmp_path, '--index', 'identifier,timestamp')
+
+    assert result.exit_code == 0
+    assert 'Error reconstructing pairs from row 3' in result.output
+
+    columns = [(row[1], row[2]) for row in connection.execute(
+        'PRAGMA table_info(qs_records)')]
+    assert columns == [('identifier', 'TEXT'),
+                       ('timestamp', 'INTEGER'),
+                       ('_model', 'TEXT'),
+                       ('batteryPct', 'REAL'),
+                       ('event11_time', 'INTEGER'),
+                       ('event_vars', 'TEXT'),
+                       ('info_runDat4', 'TEXT'),
+                       ('late_key', 'TEXT')]
+
+    assert connection.execute(
+        'SELECT * FROM qs_records ORDER BY timestamp').fetchall() == [
+        ('LOG', 1546902289, 'LG-M327', 0.79, 1546901849405,
+         '[["subtype","disconnected"]]', '{"app_install_time":1545251927594}',
+         None),
+        ('LOG', 1546902290, 'SM-N960U', None, 1, None, None, None),
+        ('LOG', 1546902292, 'moto z3', None, None, None, None, 'surprise')
+    ]
+
+    assert [row[1] for row in connection.execute(
+        'PRAGMA index_list(qs_records)')] == [
+        'idx_qs_records_identifier_timestamp']
+
+
+def test_it_parses_in_parallel_processes(tmp_path):
+    result, connection = _load(tmp_path, '--jobs', '2')
+
+    assert result.exit_code == 0
+    assert connection.execute(
+        'SELECT timestamp, _model FROM qs_records ORDER BY timestamp'
+    ).fetchall() == [(1546902289, 'LG-M327'),
+                     (1546902290, 'SM-N960U'),
+                     (1546902292, 'moto z3')]
+
+
+def test_it_loads_keys_clashing_with_other_columns(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(
+        'LOG,1546902289,user=a,User=b,timestamp=1,Identifier=x\n'
+        'LOG,1546902290,USER=c,new=1,NEW=2\n')
+    db_path = str(tmp_path / 'records.db')
+
+    result = CliRunner().invoke(qs_load, ['sqlite', db_path, str(qs_path),
+                                          '--sample-size', '1'])
+
+    assert result.exit_code == 0
+    connection = sqlite3.connect(db_path)
+    assert [row[1] for row in connection.execute(
+        'PRAGMA table_info(qs_records)')] == [
+        'identifier', 'timestamp', 'user', 'key_timestamp', 'key_Identifier',
+        'new']
+    assert connection.execute(
+        'SELECT * FROM qs_records ORDER BY timestamp').fetchall() == [
+        ('LOG', 1546902289, 'b', 1, 'x', None),
+        ('LOG', 1546902290, 'c', None, None, 2)]
+
+
+def test_it_reports_errors_by_file_and_row(tmp_path):
+    qs_paths = []
+    for name in ('a', 'b'):
+        qs_path = tmp_path / f'{name}.qs'
+        qs_path.write_text(QS_ROWS)
+        qs_paths.append(str(qs_path))
+
+    for jobs in ('1', '2'):
+        result = CliRunner().invoke(qs_load, [
+            'sqlite', str(tmp_path / f'records{jobs}.db'), *qs_paths,
+            '--batch-size', '2', '--jobs', jobs])
+
+        assert result.exit_code == 0
+        assert [line.split(',')[0] for line in result.stderr.splitlines()
+                if line.startswith('Error')] == [
+            f'Error reconstructing pairs from row 3 in {qs_path}'
+            for qs_path in qs_paths]
@@ -0,0 +1,103 @@
+from click.testing import CliRunner
+
+from qsck.merge_cli import qs_merge, _external_sort
+
+HOST_A_ROWS = (
+    'LOG,1554930014,host=a,n=1\n'
+    'LOG,1554930016,host=a,n=2\n'
+    'LOG,1554930020,host=a,event_vars={subtype=disconnected}\n'
+)
+
+HOST_B_ROWS = (
+    'LOG,1554930015,host=b,n=1\n'
+    'LOG,1554930016,host=b,n=2\n'
+    'LOG,1554930021,host=b,n=3\n'
+)
+
+
+def _write(tmp_path, name, content):
+    qs_path = tmp_path / name
+    qs_path.write_text(content)
+    return str(qs_path)
+
+
+def test_it_merges_presorted_inputs_by_timestamp(tmp_path):
+    host_a = _write(tmp_path, 'a.qs', HOST_A_ROWS)
+    host_b = _write(tmp_path, 'b.qs', HOST_B_ROWS)
+
+    result = CliRunner().invoke(qs_merge, ['--presorted', host_a, host_b])
+
+    assert result.exit_code == 0
+    assert result.stdout_bytes == (
+        b'LOG,1554930014,host=a,n=1\n'
+        b'LOG,1554930015,host=b,n=1\n'
+        b'LOG,1554930016,host=a,n=2\n'
+        b'LOG,1554930016,host=b,n=2\n'
+        b'LOG,1554930020,host=a,event_vars={subtype=disconnected}\n'
+        b'LOG,1554930021,host=b,n=3\n'
+    )
+
+
+def test_it_rejects_unsorted_input_when_presorted(tmp_path):
+    unsorted = _write(tmp_path, 'u.qs', 'LOG,1554930020,n=1\n'
+                                        'LOG,1554930014,n=2\n')
+
+    result = CliRunner().invoke(qs_merge, ['--presorted', unsorted])
+
+    assert result.exit_code != 0
+    assert 'out of timestamp order' in result.output
+
+
+def test_it_accepts_any_identifier_order_within_a_second_when_presorted(
+        tmp_path):
+    host_a = _write(tmp_path, 'a.qs', 'LOG,1554930014,n=1\n'
+                                      'EVT,1554930014,n=2\n'
+                                      'LOG,1554930016,n=3\n')
+    host_b = _write(tmp_path, 'b.qs', HOST_B_ROWS)
+
+    result = CliRunner().invoke(qs_merge, ['--presorted', host_a, host_b])
+
+    assert result.exit_code == 0
+    timestamps = [int(qs_row.split(b',')[1])
+                  for qs_row in result.stdout_bytes.splitlines()]
+    assert len(timestamps) == 6 and timestamps == sorted(timestamps)
+
+
+def test_it_sorts_unsorted_inputs_and_drops_duplicates(tmp_path):
+    unsorted = _write(tmp_path, 'u.qs', 'LOG,1554930021,n=3\n'
+                                        'LOG,1554930014,n=1\n'
+                                        'LOG,1554930021,n=3\n'
+                                        'LOG,1554930015,n=2')
+    duplicates = _write(tmp_path, 'd.qs', 'LOG,1554930014,n=1\n')
+
+    result = CliRunner().invoke(qs_merge, ['--unique', unsorted, duplicates])
+
+    assert result.exit_code == 0
+    assert result.stdout_bytes == (
+        b'LOG,1554930014,n=1\n'
+        b'LOG,1554930015,n=2\n'
+        b'LOG,1554930021,n=3\n'
+    )
+
+
+def test_it_spills_sorted_runs_past_the_memory_cap(tmp_path):
+    qs_rows = [b'LOG,%d,n=%d\n' % (1554930000 + (i * 7) % 50, i)
+               for i in range(50)]
+
+    sorted_rows = list(_external_sort(iter(qs_rows), 500, str(tmp_path)))
+
+    assert sorted_rows == sorted(qs_rows, key=lambda r: int(r.split(b',')[1]))
+
+
+def test_it_drops_duplicates_within_a_second_in_any_identifier_order(
+        tmp_path):
+    qs_path = _write(tmp_path, 'a.qs', 'LOG,1554930014,n=1\n'
+                                       'EVT,1554930014,n=2\n'
+                                       'LOG,1554930014,n=1\n')
+
+    for args in (['--presorted'], []):
+        result = CliRunner().invoke(qs_merge, ['--unique', qs_path, *args])
+
+        assert result.exit_code == 0
+        assert sorted(result.stdout_bytes.splitlines()) == \
+            [b'EVT,1554930014,n=2', b'LOG,1554930014,n=1']
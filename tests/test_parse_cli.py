@@ -0,0 +1,242 @@
+import gzip
+import re
+import subprocess
+import sys
+from io import BytesIO
+from multiprocessing import Pool
+from threading import Thread
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from qsck.client import request
+from qsck.parse_cli import qs_parse, _make_server, _init_worker_cache, \
+    _ParseOptions
+
+QS_ROWS = (
+    'LOG,1546902289,user=jenkins,event_vars={subtype=disconnected},'
+    'info_runDat4={"app_install_time":1545251927594,"path":"a/b"},'
+    'time=1546902289176\n'
+    'LOG,1546902290,_app_version=(null),_model=LG-M327\n'
+)
+
+
+def test_it_outputs_one_json_record_per_input_line(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS)
+
+    result = CliRunner().invoke(qs_parse, [str(qs_path)])
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        '["LOG","1546902289",[["user","jenkins"],'
+        '["event_vars",[["subtype","disconnected"]]],'
+        '["info_runDat4",{"app_install_time":1545251927594,"path":"a\\/b"}],'
+        '["time","1546902289176"]]]',
+        '["LOG","1546902290",[["_app_version",null],["_model","LG-M327"]]]'
+    ]
+
+
+def test_it_splices_verbatim_json_with_raw_json_flag(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS)
+
+    result = CliRunner().invoke(qs_parse, ['--raw-json', str(qs_path)])
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        '["LOG","1546902289",[["user","jenkins"],'
+        '["event_vars",[["subtype","disconnected"]]],'
+        '["info_runDat4",{"app_install_time":1545251927594,"path":"a/b"}],'
+        '["time","1546902289176"]]]',
+        '["LOG","1546902290",[["_app_version",null],["_model","LG-M327"]]]'
+    ]
+
+
+def test_it_drops_rows_with_unparsable_timestamps_out_of_time_range(
+        tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('LOG,abc,a=1\n' + QS_ROWS)
+
+    result = CliRunner().invoke(qs_parse, ['--since', '1546902290',
+                                           str(qs_path)])
+
+    assert result.exit_code == 0
+    assert result.stdout == \
+        '["LOG","1546902290",[["_app_version",null],["_model","LG-M327"]]]\n'
+    assert result.stderr == ''
+
+
+def test_it_memoizes_nested_values_with_cache_size(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS * 3)
+
+    uncached = CliRunner().invoke(qs_parse, [str(qs_path)])
+    result = CliRunner().invoke(
+        qs_parse, ['--cache-size', '10', '--cache-stats', str(qs_path)])
+
+    assert result.exit_code == 0
+    assert result.stdout == uncached.stdout
+    assert 'Nested value cache: 4 hits, 2 misses (66.7% hit rate)' in \
+        result.stderr
+
+
+def test_it_tallies_cache_stats_of_worker_processes(tmp_path):
+    qs_paths = []
+    for name in ('a.qs', 'b.qs'):
+        qs_path = tmp_path / name
+        qs_path.write_text(QS_ROWS * 3)
+        qs_paths.append(str(qs_path))
+
+    result = CliRunner().invoke(qs_parse, [
+        '--cache-size', '10', '--cache-stats', '--jobs', '2'] + qs_paths)
+
+    assert result.exit_code == 0
+    hits, misses = map(int, re.search(r'cache: (\d+) hits, (\d+) misses',
+                                      result.stderr).groups())
+    assert hits >= 8 and hits + misses == 12
+
+
+def test_it_parses_paths_from_stdin_in_parallel(tmp_path):
+    qs_paths = []
+    for name in ('a.qs', 'b.qs'):
+        qs_path = tmp_path / name
+        qs_path.write_text(QS_ROWS)
+        qs_paths.append(str(qs_path))
+
+    single = CliRunner().invoke(qs_parse, [qs_paths[0]])
+    for jobs in ('1', '2'):
+        result = CliRunner().invoke(
+            qs_parse, ['--stdin-paths', '--jobs', jobs],
+            input='\n'.join(qs_paths) + '\n')
+
+        assert result.exit_code == 0
+        assert result.stdout == single.stdout * 2
+
+
+def test_it_reports_unreadable_stdin_paths_and_parses_the_rest(tmp_path):
+    qs_path = tmp_path / 'a.qs'
+    qs_path.write_text(QS_ROWS)
+    missing_path = str(tmp_path / 'missing.qs')
+
+    single = CliRunner().invoke(qs_parse, [str(qs_path)])
+    for jobs in ('1', '2'):
+        result = CliRunner().invoke(
+            qs_parse, ['--stdin-paths', '--jobs', jobs],
+            input=f'{missing_path}\n{qs_path}\n')
+
+        assert result.exit_code == 1
+        assert result.stdout == single.stdout
+        assert f'Error reading {missing_path}' in result.stderr
+
+
+def test_it_serves_parse_requests_over_a_unix_socket(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS + 'LOG,1546902291\n')
+    socket_path = str(tmp_path / 'qs-parse.sock')
+
+    with Pool(2, _init_worker_cache, (0,)) as pool:
+        options = _ParseOptions(False, None, None, None, 10000, None,
+                                None)
+        server = _make_server(socket_path, pool, options)
+        server_thread = Thread(target=server.serve_forever)
+        server_thread.start()
+        try:
+            stdout, stderr = BytesIO(), BytesIO()
+            exit_status = request(socket_path, [str(qs_path), str(qs_path)],
+                                  stdout, stderr)
+            missing_status = request(socket_path, [str(tmp_path / 'x.qs')],
+                                     BytesIO(), BytesIO())
+        finally:
+            server.shutdown()
+            server.server_close()
+            server_thread.join()
+
+    single = CliRunner().invoke(qs_parse, [str(qs_path)])
+    assert exit_status == 0
+    assert stdout.getvalue().decode() == single.stdout * 2
+    assert stderr.getvalue().count(b'Error reconstructing pairs from row 3') \
+        == 2
+    assert missing_status == 1
+
+
+def test_it_only_replaces_stale_sockets(tmp_path):
+    options = _ParseOptions(False, None, None, None, 10000, None, None)
+    file_path = tmp_path / 'not-a-socket'
+    file_path.write_text('keep me')
+    socket_path = str(tmp_path / 'qs-parse.sock')
+
+    with pytest.raises(click.ClickException):
+        _make_server(str(file_path), None, options)
+    assert file_path.read_text() == 'keep me'
+
+    server = _make_server(socket_path, None, options)
+    try:
+        with pytest.raises(click.ClickException):
+            _make_server(socket_path, None, options)
+    finally:
+        server.server_close()
+
+    _make_server(socket_path, None, options).server_close()
+
+
+def test_it_rejects_options_it_cant_serve_with(tmp_path):
+    for option in (['--output-dir', str(tmp_path)], ['--infer-schema']):
+        result = CliRunner().invoke(qs_parse, [
+            '--serve', str(tmp_path / 'qs-parse.sock')] + option)
+
+        assert result.exit_code == 2
+        assert '`--serve` can\'t be used with' in result.stderr
+
+
+def test_the_client_starts_without_importing_the_parser():
+    imported = subprocess.run(
+        [sys.executable, '-c', 'import sys, qsck.client; '
+                               'print(sorted(sys.modules))'],
+        stdout=subprocess.PIPE, check=True).stdout.decode()
+
+    assert 'ujson' not in imported
+    assert 'click' not in imported
+    assert 'qsck.core' not in imported
+
+
+def test_it_writes_partitioned_output_files(tmp_path):
+    qs_paths = []
+    for name in ('a', 'b'):
+        qs_path = tmp_path / f'{name}.qs'
+        qs_path.write_text(QS_ROWS + 'EVT,1546909489,x=1\n')
+        qs_paths.append(str(qs_path))
+    single = CliRunner().invoke(qs_parse, [qs_paths[0]])
+
+    for jobs in ('1', '2'):
+        output_dir = tmp_path / f'out{jobs}'
+        result = CliRunner().invoke(qs_parse, [
+            '--output-dir', str(output_dir), '--compression', 'gzip',
+            '--jobs', jobs] + qs_paths)
+
+        assert result.exit_code == 0
+        assert result.stdout == ''
+        partitions = {str(path.relative_to(output_dir)): gzip.open(path).read()
+                      for path in output_dir.rglob('*') if path.is_file()}
+        assert partitions == {
+            'identifier=LOG/hour=2019-01-07T23.json.gz':
+                ''.join(single.stdout.splitlines(keepends=True)[:2] * 2)
+                .encode(),
+            'identifier=EVT/hour=2019-01-08T01.json.gz':
+                single.stdout.splitlines(keepends=True)[2].encode() * 2}
+
+
+def test_it_reports_rows_it_cant_partition_and_writes_the_rest(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('LOG,abc,a=1\n' + QS_ROWS)
+    output_dir = tmp_path / 'out'
+
+    result = CliRunner().invoke(qs_parse, [
+        '--output-dir', str(output_dir), str(qs_path)])
+
+    assert result.exit_code == 0
+    assert 'row 1 in' in result.stderr
+    assert "Timestamp 'abc'" in result.stderr
+    assert [path.name for path in output_dir.rglob('*') if path.is_file()] \
+        == ['hour=2019-01-07T23.json']
@@ -0,0 +1,117 @@
+import pytest
+
+import qsck
+from qsck import deserialize, serialize
+
+QS_ROWS = [
+    'LOG,1546902289,user=jenkins,event_vars={subtype=disconnected},'
+    'time=1546902289176',
+    'EVT,1546902290,_model=LG-M327,user=root',
+    'LOG,1546902291,user=root,event_vars={subtype=connected},x=1',
+    'LOG,1546902292,user=root,x=2',
+]
+
+
+def _upper_user(record):
+    identifier, timestamp, key_value_pairs = record
+    return identifier, timestamp, [
+        (key, value.upper() if key == 'user' else value)
+        for key, value in key_value_pairs]
+
+
+def _is_root(record):
+    return ('user', 'root') in record[2]
+
+
+@pytest.fixture
+def qs_paths(tmp_path):
+    qs_paths = []
+    for name in ('a', 'b'):
+        qs_path = tmp_path / f'{name}.qs'
+        qs_path.write_text('\n'.join(QS_ROWS) + '\n\n')
+        qs_paths.append(str(qs_path))
+
+    return qs_paths
+
+
+def test_it_reads_all_records_lazily(qs_paths):
+    pipeline = qsck.read(qs_paths[0])
+
+    assert list(pipeline) == [deserialize(qs_row) for qs_row in QS_ROWS]
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_it_runs_stages_in_order(qs_paths, jobs):
+    pipeline = qsck.read(qs_paths, jobs=jobs) \
+        .where(_is_root, identifier='LOG', since=1546902290) \
+        .select('user', 'x') \
+        .map(_upper_user)
+
+    assert list(pipeline) == [
+        ('LOG', '1546902291', [('user', 'ROOT'), ('x', '1')]),
+        ('LOG', '1546902292', [('user', 'ROOT'), ('x', '2')])] * 2
+
+
+def test_it_only_deserializes_rows_passing_header_filters(qs_paths):
+    pipeline = qsck.read(qs_paths[0]).where(identifier=('EVT',)).map(
+        _upper_user).where(until=1546902289)
+
+    assert list(pipeline) == []
+    read_stats, parse_stats, map_stats, where_stats = pipeline.stats
+    assert read_stats.name == "read + where(identifier=('EVT',))"
+    assert (read_stats.rows_in, read_stats.rows_out) == (5, 1)
+    assert parse_stats.rows_in == 1
+    assert map_stats.name == 'map(_upper_user)'
+    assert (where_stats.rows_in, where_stats.rows_out) == (1, 0)
+
+
+def _identity(record):
+    return record
+
+
+def test_it_never_matches_unparsable_timestamps_fused_or_not(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('LOG,abc,a=1\n' + '\n'.join(QS_ROWS) + '\n')
+
+    fused = qsck.read(str(qs_path)).where(identifier='LOG')
+    unfused = qsck.read(str(qs_path)).map(_identity).where(identifier='LOG')
+
+    assert list(fused) == list(unfused) == [
+        deserialize(qs_row) for qs_row in QS_ROWS if qs_row.startswith('LOG')]
+
+
+def test_it_reports_and_skips_rows_it_cant_deserialize(tmp_path, capfd):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text(QS_ROWS[0] + '\nLOG,1546902290\n' + QS_ROWS[1] + '\n')
+    errors = []
+
+    for jobs in (1, 2):
+        pipeline = qsck.read([str(qs_path)] * 2, jobs=jobs)
+
+        assert list(pipeline) == [deserialize(QS_ROWS[0]),
+                                  deserialize(QS_ROWS[1])] * 2
+        parse_stats = pipeline.stats[1]
+        assert (parse_stats.rows_in, parse_stats.rows_out) == (6, 4)
+        assert capfd.readouterr().err.count(
+            f'Error reconstructing pairs from row 2 in {qs_path}, ') == 2
+
+    pipeline = qsck.read(str(qs_path), on_error=lambda *error: errors.append(
+        error)).select('user')
+    assert len(list(pipeline)) == 2
+    assert [error[:3] for error in errors] == [
+        (str(qs_path), 2, b'LOG,1546902290\n')]
+
+
+def test_it_writes_to_a_path_or_writer(qs_paths, tmp_path):
+    output_path = str(tmp_path / 'out.qs')
+    pipeline = qsck.read(qs_paths).where(identifier='EVT')
+
+    assert pipeline.write(output_path) == 2
+    assert open(output_path).read() == \
+        serialize(*deserialize(QS_ROWS[1])) * 2
+    assert pipeline.stats[-1].name == 'write'
+    assert pipeline.stats[-1].rows_out == 2
+
+    with qsck.PartitionedWriter(str(tmp_path / 'out')) as qs_writer:
+        assert qsck.read(qs_paths).write(qs_writer) == 8
+    assert len(qs_writer.partition_paths) == 2
@@ -0,0 +1,78 @@
+from collections import Counter
+
+import pytest
+import ujson
+from click.testing import CliRunner
+
+from qsck import deserialize, sample_rows
+from qsck.parse_cli import qs_parse
+from qsck.writer import QsWriter
+
+QS_ROWS = [f'{("LOG", "EVT", "ERR")[idx % 3]},{1546902289 + idx},n={idx}'
+           for idx in range(3000)]
+
+
+def test_it_samples_rows_at_a_rate_reproducibly():
+    sampled_rows = list(sample_rows(QS_ROWS, rate=0.1, seed=1))
+
+    assert 200 < len(sampled_rows) < 400
+    assert sampled_rows == list(sample_rows(QS_ROWS, rate=0.1, seed=1))
+    assert sampled_rows != list(sample_rows(QS_ROWS, rate=0.1, seed=2))
+    assert sampled_rows == [qs_row for qs_row in QS_ROWS
+                            if qs_row in set(sampled_rows)]
+
+
+def test_it_picks_the_same_rows_from_str_and_bytes_lines():
+    qs_lines = [qs_row.encode('utf-8') + b'\n' for qs_row in QS_ROWS]
+
+    assert [qs_line.decode('utf-8').rstrip('\n')
+            for qs_line in sample_rows(qs_lines, rate=0.05)] == \
+        list(sample_rows(QS_ROWS, rate=0.05))
+
+
+def test_it_samples_a_reservoir_in_input_order():
+    sampled_rows = list(sample_rows(iter(QS_ROWS), size=50))
+
+    assert len(sampled_rows) == 50
+    assert sampled_rows == sorted(sampled_rows, key=QS_ROWS.index)
+    assert len(list(sample_rows(QS_ROWS[:10], size=50))) == 10
+
+
+def test_it_samples_a_reservoir_per_identifier():
+    sampled_rows = list(sample_rows(QS_ROWS[:-1] + ['RARE,1546902289,n=x'],
+                                    size=20, stratify=True))
+
+    assert Counter(qs_row.split(',')[0] for qs_row in sampled_rows) == \
+        {'LOG': 20, 'EVT': 20, 'ERR': 20, 'RARE': 1}
+
+
+def test_it_rejects_ambiguous_sampling():
+    with pytest.raises(ValueError):
+        list(sample_rows(QS_ROWS, rate=0.1, size=10))
+    with pytest.raises(ValueError):
+        list(sample_rows(QS_ROWS, rate=0.1, stratify=True))
+
+
+def test_it_parses_only_sampled_rows(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('\n'.join(QS_ROWS) + '\n')
+    bgz_path = str(tmp_path / 'records.qs.bgz')
+    with QsWriter(bgz_path, block_size=4096) as writer:
+        writer.write_many(deserialize(qs_row) for qs_row in QS_ROWS)
+
+    for sample_args in (['--sample', '0.1'], ['--sample-n', '25']):
+        result = CliRunner().invoke(qs_parse, sample_args + [str(qs_path)])
+        bgz_result = CliRunner().invoke(
+            qs_parse, sample_args + ['--jobs', '2', bgz_path])
+
+        assert result.exit_code == 0
+        json_records = [ujson.loads(line)
+                        for line in result.stdout.splitlines()]
+        assert [f'{identifier},{timestamp},n={n}'
+                for identifier, timestamp, [[_, n]] in json_records] == \
+            list(sample_rows(QS_ROWS, *([0.1] if '--sample' in sample_args
+                                        else [None, 25])))
+        assert bgz_result.stdout == result.stdout
+
+    result = CliRunner().invoke(qs_parse, ['--stratify', str(qs_path)])
+    assert result.exit_code == 2
@@ -0,0 +1,93 @@
+import pytest
+import ujson
+from click.testing import CliRunner
+
+from qsck import iter_deserialize, Schema
+from qsck.parse_cli import qs_parse
+
+QS_ROWS = [
+    'LOG,1554930014,_model=SM-N960U,battery=87,temp=31.5,charging=true,'
+    'event6_vars={isDocked=true, networkInfo=[type: MOBILE, roaming: false]},'
+    'info_runDat4={"app_install_time":1545251927594,"n":"0.5"},'
+    'time=1546902289176',
+    'LOG,1554930015,_model=LG-M327,battery=12,temp=29,charging=False,'
+    'event6_vars={isDocked=false, networkInfo=[type: WIFI, roaming: true]},'
+    'info_runDat4={"app_install_time":1545251927595,"n":"1"},'
+    'time=1546902290176',
+]
+
+
+def test_it_infers_non_str_value_types():
+    schema = Schema.infer(list(iter_deserialize(QS_ROWS)))
+
+    assert schema.to_dict() == {
+        'battery': 'int', 'temp': 'float', 'charging': 'bool',
+        'event6_vars.isDocked': 'bool',
+        'event6_vars.networkInfo.roaming': 'bool',
+        'info_runDat4.n': 'float', 'time': 'epoch_ms'}
+
+
+def test_it_coerces_values_column_wise():
+    schema = Schema({'battery': 'int', 'temp': 'float', 'charging': 'bool',
+                     'event6_vars.networkInfo.roaming': 'bool',
+                     'info_runDat4.n': 'float', 'time': 'epoch_ms'})
+
+    records, null_mask = schema.coerce(list(iter_deserialize(QS_ROWS)))
+
+    assert null_mask == {}
+    _, __, key_value_pairs = records[1]
+    assert dict(key_value_pairs)['battery'] == 12
+    assert dict(key_value_pairs)['temp'] == 29.0
+    assert dict(key_value_pairs)['charging'] is False
+    assert dict(key_value_pairs)['time'] == 1546902290176
+    assert dict(key_value_pairs)['event6_vars'][1] == \
+        ('networkInfo', [('type', 'WIFI'), ('roaming', True)])
+    assert dict(key_value_pairs)['info_runDat4']['n'] == 1.0
+    assert dict(key_value_pairs)['_model'] == 'LG-M327'
+
+
+def test_it_nulls_values_not_fitting_their_type():
+    schema = Schema({'battery': 'int', 'charging': 'bool', 'time': 'epoch_ms'})
+    qs_rows = ['LOG,1554930014,battery=87,charging=true,time=1546902289176',
+               'LOG,1554930015,battery=n/a,charging=yes,time=1546902290',
+               'LOG,1554930016,battery=(null),charging=false']
+
+    records, null_mask = schema.coerce(list(iter_deserialize(qs_rows)))
+
+    assert null_mask == {'battery': [1], 'charging': [1], 'time': [1]}
+    assert [dict(key_value_pairs)['battery']
+            for _, __, key_value_pairs in records] == [87, None, None]
+    assert [dict(key_value_pairs)['charging']
+            for _, __, key_value_pairs in records] == [True, None, False]
+
+
+def test_it_nulls_infinite_and_nan_floats():
+    schema = Schema({'temp': 'float'})
+    qs_rows = [f'LOG,1554930014,temp={temp}'
+               for temp in ('31.5', 'inf', '1e999', 'nan', '-Infinity')]
+
+    records, null_mask = schema.coerce(list(iter_deserialize(qs_rows)))
+
+    assert null_mask == {'temp': [1, 2, 3, 4]}
+    assert [dict(key_value_pairs)['temp']
+            for _, __, key_value_pairs in records] == [31.5] + [None] * 4
+
+
+def test_it_rejects_unsupported_types():
+    with pytest.raises(ValueError):
+        Schema({'battery': 'decimal'})
+
+
+def test_it_outputs_typed_values_with_an_inferred_schema(tmp_path):
+    qs_path = tmp_path / 'records.qs'
+    qs_path.write_text('\n'.join(QS_ROWS) + '\n'
+                       'LOG,1554930016,battery=n/a\n')
+
+    result = CliRunner().invoke(
+        qs_parse, ['--infer-schema', '--batch-size', '2', str(qs_path)])
+
+    assert result.exit_code == 0
+    json_records = [ujson.loads(line) for line in result.stdout.splitlines()]
+    assert json_records[0][2][1] == ['battery', 87]
+    assert json_records[2][2][0] == ['battery', None]
+    assert "'battery'" in result.stderr and 'rows 3' in result.stderr
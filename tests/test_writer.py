@@ -0,0 +1,120 @@
+import bz2
+import gzip
+import io
+
+from pytest import raises
+
+from qsck import PartitionedWriter, QsWriter, serialize
+
+RECORDS = [
+    ('LOG', '1554930014', [('_model', 'SM-N960U'),
+                           ('event6_vars', [('networkInfo',
+                                             [('type', 'MOBILE[LTE]')])]),
+                           ('nest3', {'k31': 2.0, 'k32': None})]),
+    ('LOG', 1554930015, [('empty', []), ('fw_int', '27'), ('x', None)]),
+]
+
+
+def test_it_writes_the_same_rows_as_serialize():
+    output = io.BytesIO()
+
+    with QsWriter(output) as qs_writer:
+        qs_writer.write_many(RECORDS)
+
+    assert output.getvalue().decode('utf-8') == ''.join(
+        serialize(*record) for record in RECORDS)
+
+
+def test_it_buffers_rows_until_flush_every_is_reached():
+    output = io.StringIO()
+    qs_writer = QsWriter(output, flush_every=100)
+
+    qs_writer.write('LOG', '1554930014', [('a', '1')])
+    assert output.getvalue() == ''
+
+    qs_writer.write('LOG', '1554930014', [('b', 'x' * 100)])
+    assert output.getvalue().startswith('LOG,1554930014,a=1\n')
+
+    qs_writer.close()
+    assert qs_writer.rows_written == 2
+    with raises(ValueError):
+        qs_writer.write('LOG', '1554930014', [('a', '1')])
+
+
+def test_it_compresses_output_by_path_suffix(tmp_path):
+    for suffix, opener in (('.qs.gz', gzip.open), ('.qs.bz2', bz2.open)):
+        qs_path = str(tmp_path / f'records{suffix}')
+
+        with QsWriter(qs_path) as qs_writer:
+            qs_writer.write_many(RECORDS)
+
+        with opener(qs_path, 'rt') as qs_file:
+            assert qs_file.read() == ''.join(
+                serialize(*record) for record in RECORDS)
+
+
+def test_it_rejects_unsupported_compression():
+    with raises(ValueError):
+        QsWriter(io.BytesIO(), compression='zip')
+
+
+def _read_partitions(output_dir, open_file=open) -> dict:
+    return {str(path.relative_to(output_dir)): open_file(path, 'rb').read()
+            for path in output_dir.rglob('*') if path.is_file()}
+
+
+def test_it_writes_partitions_by_identifier_and_hour(tmp_path):
+    records = [('LOG', 1554930014, [('a', '1')]),
+               ('EVT', 1554930015, [('b', '2')]),
+               ('LOG', 1554933614, [('c', '3')]),
+               ('LOG', 1554930016, [('d', '4')])]
+
+    with PartitionedWriter(str(tmp_path), max_open_files=1,
+                           flush_every=1) as qs_writer:
+        qs_writer.write_many(records)
+        assert list(tmp_path.rglob('*.qs')) == []
+
+    assert qs_writer.rows_written == 4
+    assert _read_partitions(tmp_path) == {
+        'identifier=LOG/hour=2019-04-10T21.qs':
+            (serialize(*records[0]) + serialize(*records[3])).encode(),
+        'identifier=EVT/hour=2019-04-10T21.qs':
+            serialize(*records[1]).encode(),
+        'identifier=LOG/hour=2019-04-10T22.qs':
+            serialize(*records[2]).encode()}
+
+
+def test_it_appends_to_reopened_compressed_partitions(tmp_path):
+    with PartitionedWriter(str(tmp_path), ('day',), suffix='.qs.gz',
+                           max_open_files=1, flush_every=1) as qs_writer:
+        for timestamp in (1554930014, 1555030014, 1554930015):
+            qs_writer.write_line('LOG', timestamp, str(timestamp))
+
+    assert _read_partitions(tmp_path, gzip.open) == {
+        'day=2019-04-10.qs.gz': b'1554930014\n1554930015\n',
+        'day=2019-04-12.qs.gz': b'1555030014\n'}
+
+
+def test_it_leaves_partitions_partial_on_errors(tmp_path):
+    with raises(RuntimeError):
+        with PartitionedWriter(str(tmp_path), flush_every=1) as qs_writer:
+            qs_writer.write('LOG', 1554930014, [('a', '1')])
+            raise RuntimeError('Parsing failed')
+
+    assert list(_read_partitions(tmp_path)) == \
+        ['identifier=LOG/hour=2019-04-10T21.qs.partial']
+
+
+def test_it_rejects_unsupported_partition_fields(tmp_path):
+    with raises(ValueError):
+        PartitionedWriter(str(tmp_path), ('identifier', 'minute'))
+
+
+def test_it_rejects_lines_without_an_epoch_timestamp(tmp_path):
+    with PartitionedWriter(str(tmp_path)) as qs_writer:
+        with raises(ValueError):
+            qs_writer.write_line('LOG', 'abc', '["LOG","abc",[]]')
+        qs_writer.write_line('LOG', '1554930014', '["LOG","1554930014",[]]')
+
+    assert list(_read_partitions(tmp_path)) == \
+        ['identifier=LOG/hour=2019-04-10T21.qs']